@@ -0,0 +1,267 @@
+# ========================================================================
+#
+# Imports
+#
+# ========================================================================
+import itertools
+import numpy as np
+
+
+# ========================================================================
+#
+# Function definitions
+#
+# ========================================================================
+def pair_name(a, b):
+    """Column name for the second moment of variables a and b"""
+    if len(a) == 1 and len(b) == 1:
+        return a + b
+    return f"{a}_{b}"
+
+
+# ========================================================================
+def ordered_pairs(names, first=()):
+    """All unique pairs of names, starting with the pairs in first"""
+    pairs = [tuple(p) for p in first]
+    pairs += [
+        p
+        for p in itertools.combinations_with_replacement(names, 2)
+        if p not in pairs and p[::-1] not in pairs
+    ]
+    return pairs
+
+
+# ========================================================================
+#
+# Classes
+#
+# ========================================================================
+class MomentAccumulator:
+    """Streaming mean and central second moments of nodal variables
+
+    Each call to push adds one sample (one time step) for every node
+    using Welford's update. Two accumulators over the same nodes can be
+    combined with merge (Chan et al. pairwise update), which is what
+    allows partial results to be computed separately and folded
+    together later.
+
+    The second moments can be stored in a smaller dtype (e.g. float32)
+    to save memory. The means stay in float64 since the fluctuations
+    are computed against them, and each update is done in float64.
+    """
+
+    def __init__(self, names, pairs=None, dtype=np.float64):
+        self.names = list(names)
+        if pairs is None:
+            pairs = list(itertools.combinations_with_replacement(self.names, 2))
+        self.pairs = [(a, b) for a, b in pairs]
+        self._ia = np.array([self.names.index(a) for a, _ in self.pairs], dtype=int)
+        self._ib = np.array([self.names.index(b) for _, b in self.pairs], dtype=int)
+        self.dtype = np.dtype(dtype)
+        self.count = 0
+        self.mean = None
+        self.m2 = None
+
+    @property
+    def pair_names(self):
+        return [pair_name(a, b) for a, b in self.pairs]
+
+    def _allocate(self, nnodes):
+        self.mean = np.zeros((nnodes, len(self.names)))
+        self.m2 = np.zeros((nnodes, len(self.pairs)), dtype=self.dtype)
+
+    def push(self, values):
+        """Add one sample, values has shape (nnodes, len(names))"""
+        self.push_chunks(values.shape[0], [(slice(None), values)])
+
+    def push_chunks(self, nnodes, chunks):
+        """Add one sample given in node ranges
+
+        chunks yields (rows, values) pairs, rows a slice of the nnodes
+        nodes and values the sample on those nodes, and must cover every
+        node once. With a generator only one range is held in memory.
+        """
+        if self.mean is None:
+            self._allocate(nnodes)
+        self.count += 1
+        for rows, values in chunks:
+            delta = values - self.mean[rows]
+            self.mean[rows] += delta / self.count
+            self.m2[rows] += delta[:, self._ia] * (values - self.mean[rows])[:, self._ib]
+
+    def merge(self, other):
+        """Fold another accumulator over the same nodes into this one"""
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count = other.count
+            self.mean = other.mean.copy()
+            self.m2 = other.m2.copy()
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.m2 += (
+            other.m2
+            + delta[:, self._ia] * delta[:, self._ib] * self.count * other.count / count
+        )
+        self.mean += delta * other.count / count
+        self.count = count
+        return self
+
+    def covariance(self):
+        """Central second moments (population normalization)"""
+        return self.m2 / max(self.count, 1)
+
+    def state(self):
+        """Return the accumulator state as a dictionary of arrays"""
+        return {
+            "names": np.array(self.names),
+            "pairs": np.array(self.pairs).reshape(-1, 2),
+            "count": np.array(self.count),
+            "mean": self.mean,
+            "m2": self.m2,
+        }
+
+    @classmethod
+    def from_state(cls, state, dtype=None):
+        """Build an accumulator from the output of state
+
+        The second moments keep their saved dtype unless dtype is given.
+        """
+        if dtype is None:
+            m2 = state.get("m2")
+            dtype = np.float64 if m2 is None else np.asarray(m2).dtype
+        acc = cls(
+            [str(n) for n in state["names"]],
+            pairs=[(str(a), str(b)) for a, b in state["pairs"]],
+            dtype=dtype,
+        )
+        acc.count = int(state["count"])
+        if state.get("mean") is not None:
+            acc.mean = np.array(state["mean"], dtype=np.float64)
+            acc.m2 = np.array(state["m2"], dtype=acc.dtype)
+        return acc
+
+
+# ========================================================================
+class StationMoments:
+    """Streaming moments up to fourth order and histograms per station
+
+    Nodes are grouped in stations (e.g. wall-normal lines) by labels.
+    Each push adds, per station and variable, the power sums of
+    (values - shift) up to the fourth power and the counts in nbins
+    uniform bins between lo and hi. shift should be close to the station
+    mean (e.g. the mean of a first sample), which keeps the power sums
+    well conditioned. Values outside the bins are left out of the
+    histograms and counted apart, below lo and above hi (tails).
+
+    The power sums and counts are additive, so partial results (from
+    other ranks or a checkpoint) are merged by summing them, e.g. with
+    an MPI SUM reduction.
+    """
+
+    order = 4
+
+    def __init__(self, labels, shift, lo, hi, nbins):
+        self.shift = np.array(shift, dtype=np.float64)
+        self.lo = np.array(lo, dtype=np.float64)
+        self.hi = np.array(hi, dtype=np.float64)
+        self.width = np.maximum(self.hi - self.lo, np.finfo(float).tiny) / nbins
+        self.nbins = int(nbins)
+        nstations, nvar = self.shift.shape
+        self.power = np.zeros((self.order + 1, nstations, nvar))
+        self.hist = np.zeros((nstations, nvar, self.nbins))
+        self.tails = np.zeros((nstations, nvar, 2))
+        self.labels = None
+        if labels is not None:
+            self.labels = np.asarray(labels)
+            self._flat = self.labels[:, np.newaxis] * nvar + np.arange(nvar)
+
+    def push(self, values, rows=slice(None)):
+        """Add one sample, values has shape (nnodes, nvar)
+
+        A sample can also be pushed in node ranges, values then holds
+        the nodes in the slice rows.
+        """
+        nbins = self.power.shape[1] * self.power.shape[2]
+        labels, flat = self.labels[rows], self._flat[rows]
+        delta = values - self.shift[labels]
+        term = np.ones_like(delta)
+        for p in range(self.order + 1):
+            self.power[p] += np.bincount(
+                flat.ravel(), weights=term.ravel(), minlength=nbins
+            ).reshape(self.power.shape[1:])
+            term *= delta
+
+        idx = np.floor((values - self.lo[labels]) / self.width[labels])
+        below, above = idx < 0, idx >= self.nbins
+        inside = (idx >= 0) & (idx < self.nbins)
+        self.hist += np.bincount(
+            flat[inside] * self.nbins + idx[inside].astype(np.int64),
+            minlength=self.hist.size,
+        ).reshape(self.hist.shape)
+        for k, out in enumerate((below, above)):
+            self.tails[..., k] += np.bincount(
+                flat[out], minlength=nbins
+            ).reshape(self.tails.shape[:2])
+
+    def merge(self, other):
+        """Fold another accumulator with the same shift and bins into this one"""
+        self.power += other.power
+        self.hist += other.hist
+        self.tails += other.tails
+        return self
+
+    def moments(self):
+        """Mean, variance, skewness and flatness, each (nstations, nvar)"""
+        count = np.maximum(self.power[0], 1.0)
+        m1, s2, s3, s4 = (self.power[p] / count for p in range(1, self.order + 1))
+        var = s2 - m1 ** 2
+        m3 = s3 - 3.0 * m1 * s2 + 2.0 * m1 ** 3
+        m4 = s4 - 4.0 * m1 * s3 + 6.0 * m1 ** 2 * s2 - 3.0 * m1 ** 4
+        safe = np.where(var > 0, var, 1.0)
+        return {
+            "mean": self.shift + m1,
+            "var": var,
+            "skewness": np.where(var > 0, m3 / safe ** 1.5, 0.0),
+            "flatness": np.where(var > 0, m4 / safe ** 2, 0.0),
+        }
+
+    def pdfs(self):
+        """Bin centers of the fluctuations and probability densities
+
+        Both have shape (nstations, nvar, nbins).
+        """
+        centers = self.lo[..., np.newaxis] + self.width[..., np.newaxis] * (
+            np.arange(self.nbins) + 0.5
+        )
+        centers -= self.moments()["mean"][..., np.newaxis]
+        count = np.maximum(self.power[0], 1.0)[..., np.newaxis]
+        return centers, self.hist / (count * self.width[..., np.newaxis])
+
+    def outside(self):
+        """Fraction of the values below and above the bins, (nstations, nvar, 2)"""
+        return self.tails / np.maximum(self.power[0], 1.0)[..., np.newaxis]
+
+    def state(self):
+        """Return the accumulator state as a dictionary of arrays"""
+        return {
+            "shift": self.shift,
+            "lo": self.lo,
+            "hi": self.hi,
+            "power": self.power,
+            "hist": self.hist,
+            "tails": self.tails,
+        }
+
+    @classmethod
+    def from_state(cls, labels, state):
+        """Build an accumulator over the nodes in labels from the output of state"""
+        acc = cls(
+            labels, state["shift"], state["lo"], state["hi"], np.shape(state["hist"])[-1]
+        )
+        acc.power = np.array(state["power"], dtype=np.float64)
+        acc.hist = np.array(state["hist"], dtype=np.float64)
+        if state.get("tails") is not None:
+            acc.tails = np.array(state["tails"], dtype=np.float64)
+        return acc
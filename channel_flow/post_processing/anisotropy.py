@@ -0,0 +1,103 @@
+# ========================================================================
+#
+# Imports
+#
+# ========================================================================
+import numpy as np
+
+
+# ========================================================================
+#
+# Define constants
+#
+# ========================================================================
+# Reynolds stress components in the order of the stress columns
+stress_pairs = [("u", "u"), ("v", "v"), ("w", "w"), ("u", "v"), ("u", "w"), ("v", "w")]
+tensor_index = [(0, 0), (1, 1), (2, 2), (0, 1), (0, 2), (1, 2)]
+
+# Barycentric map vertices of the one-, two- and three-component limits
+vertices = np.array([[1.0, 0.0], [0.0, 0.0], [0.5, np.sqrt(3.0) / 2.0]])
+
+
+# ========================================================================
+#
+# Function definitions
+#
+# ========================================================================
+def stress_tensor(rij):
+    """Symmetric (..., 3, 3) tensors from (..., 6) stress columns
+
+    The columns are in the order of stress_pairs.
+    """
+    rij = np.asarray(rij, dtype=np.float64)
+    tensor = np.empty(rij.shape[:-1] + (3, 3))
+    for c, (i, j) in enumerate(tensor_index):
+        tensor[..., i, j] = rij[..., c]
+        tensor[..., j, i] = rij[..., c]
+    return tensor
+
+
+# ========================================================================
+def anisotropy_tensor(rij):
+    """Anisotropy tensor b = R / (2k) - I / 3 and the kinetic energy k
+
+    Stations without fluctuations (e.g. on the walls) get NaN.
+    """
+    tensor = stress_tensor(rij)
+    k = 0.5 * np.trace(tensor, axis1=-2, axis2=-1)
+    safe = np.where(k > 0, k, np.nan)
+    return tensor / (2.0 * safe[..., np.newaxis, np.newaxis]) - np.eye(3) / 3.0, k
+
+
+# ========================================================================
+def invariants(b):
+    """Lumley invariants and their Pope (xi, eta) form
+
+    II = -b_ij b_ji / 2 and III = b_ij b_jk b_ki / 3, with
+    6 eta^2 = b_ij b_ji and 6 xi^3 = b_ij b_jk b_ki.
+    """
+    b2 = np.einsum("...ij,...ji->...", b, b)
+    b3 = np.einsum("...ij,...jk,...ki->...", b, b, b)
+    return {
+        "II": -0.5 * b2,
+        "III": b3 / 3.0,
+        "xi": np.cbrt(b3 / 6.0),
+        "eta": np.sqrt(b2 / 6.0),
+    }
+
+
+# ========================================================================
+def barycentric(b):
+    """Barycentric map weights and coordinates of anisotropy tensors
+
+    The weights of the one-, two- and three-component limits follow
+    from the eigenvalues l1 >= l2 >= l3 of b (Banerjee et al. 2007):
+    C1 = l1 - l2, C2 = 2 (l2 - l3), C3 = 3 l3 + 1. Returns the weights
+    (..., 3) and the map coordinates (..., 2).
+    """
+    valid = np.isfinite(b).all(axis=(-2, -1))
+    lam = np.full(b.shape[:-1], np.nan)
+    lam[valid] = np.linalg.eigvalsh(b[valid])[..., ::-1]
+    l1, l2, l3 = lam[..., 0], lam[..., 1], lam[..., 2]
+    weights = np.stack((l1 - l2, 2.0 * (l2 - l3), 3.0 * l3 + 1.0), axis=-1)
+    return weights, weights @ vertices
+
+
+# ========================================================================
+def anisotropy_map(rij):
+    """Anisotropy tensor, invariants and barycentric map of stresses
+
+    rij holds the stress columns (in the order of stress_pairs) of any
+    number of stations, e.g. (nplanes, nz, 6). Returns a dictionary of
+    arrays with the leading shape of rij.
+    """
+    b, k = anisotropy_tensor(rij)
+    weights, xy = barycentric(b)
+    out = {"k": k}
+    for (a, c), (i, j) in zip(stress_pairs, tensor_index):
+        out[f"b_{a}{c}"] = b[..., i, j]
+    out.update(invariants(b))
+    for n, name in enumerate(["C1", "C2", "C3"]):
+        out[name] = weights[..., n]
+    out["xb"], out["yb"] = xy[..., 0], xy[..., 1]
+    return out
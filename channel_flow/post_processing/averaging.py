@@ -0,0 +1,231 @@
+# ========================================================================
+#
+# Imports
+#
+# ========================================================================
+import numpy as np
+import pandas as pd
+
+
+# ========================================================================
+#
+# Define constants
+#
+# ========================================================================
+default_tol = 1e-7
+
+
+# ========================================================================
+#
+# Function definitions
+#
+# ========================================================================
+def dense_labels(keys):
+    """Map integer keys to 0..n-1, preserving their order
+
+    Keys are hashed (O(N)) and only the unique keys are sorted.
+    """
+    codes, uniq = pd.factorize(keys)
+    order = np.argsort(uniq)
+    ranks = np.empty(len(uniq), dtype=np.int64)
+    ranks[order] = np.arange(len(uniq))
+    return ranks[codes], len(uniq)
+
+
+# ========================================================================
+def quantize(values, origin, tol=default_tol):
+    """Integer keys of width tol for coordinate values"""
+    return np.floor((np.asarray(values) - origin) / tol).astype(np.int64)
+
+
+# ========================================================================
+def run_ids(sorted_keys):
+    """Line id for each sorted unique key, merging adjacent keys
+
+    Adjacent occupied keys are merged so that a lattice line split by
+    round-off across a key boundary stays a single line.
+    """
+    starts = np.concatenate(([True], np.diff(sorted_keys) > 1))
+    return np.cumsum(starts) - 1
+
+
+# ========================================================================
+def line_labels(values, tol=default_tol):
+    """Label coordinates so that values within tol share a label
+
+    Labels are ordered by coordinate value.
+    """
+    values = np.asarray(values)
+    if len(values) == 0:
+        return np.zeros(0, dtype=np.int64), 0
+    codes, uniq = pd.factorize(quantize(values, values.min(), tol))
+    order = np.argsort(uniq)
+    ids = run_ids(uniq[order])
+    lines = np.empty(len(uniq), dtype=np.int64)
+    lines[order] = ids
+    return lines[codes], int(ids[-1]) + 1
+
+
+# ========================================================================
+#
+# Classes
+#
+# ========================================================================
+class HomogeneousAverage:
+    """Average nodal data over homogeneous coordinate directions
+
+    coords is an (N, ndim) array and keep lists the coordinate
+    directions retained in the output (e.g. [0, 2] to average over y
+    and keep x and z). Bins are built once per point set and sorted
+    lexicographically by the kept coordinates, like a pandas groupby
+    followed by sort_values.
+
+    If the points form a complete tensor-product lattice they are
+    scattered into a dense array and reduced with a reshape, otherwise
+    the bins are reduced with np.bincount on quantized keys.
+
+    With weights (e.g. lumped nodal volumes) the means are weighted
+    and counts holds the total weight of each bin.
+    """
+
+    def __init__(self, coords, keep, tol=default_tol, weights=None):
+        coords = np.asarray(coords)
+        self.npts, ndim = coords.shape
+        self.keep = list(keep)
+        self.weights = None if weights is None else np.asarray(weights, dtype=np.float64)
+        self.homogeneous = [d for d in range(ndim) if d not in self.keep]
+
+        axes = [line_labels(coords[:, d], tol) for d in range(ndim)]
+        labels = [lbl for lbl, _ in axes]
+        self.shape = tuple(n for _, n in axes)
+
+        # Tensor-product lattice with exactly one point per cell
+        self.structured = False
+        if self.npts > 0 and np.prod(self.shape) == self.npts:
+            self.lattice_index = np.ravel_multi_index(labels, self.shape)
+            self.structured = (
+                np.bincount(self.lattice_index, minlength=self.npts).max() == 1
+            )
+
+        if self.structured:
+            kept_shape = [self.shape[d] for d in self.keep]
+            self.nbins = int(np.prod(kept_shape))
+            self.labels = np.ravel_multi_index([labels[d] for d in self.keep], kept_shape)
+        elif self.npts == 0:
+            self.labels, self.nbins = np.zeros(0, dtype=np.int64), 0
+        elif len(self.keep) > 0:
+            self.labels, self.nbins = dense_labels(
+                np.ravel_multi_index(
+                    [labels[d] for d in self.keep], [self.shape[d] for d in self.keep]
+                )
+            )
+        else:
+            self.labels, self.nbins = np.zeros(self.npts, dtype=np.int64), 1
+
+        self.counts = np.bincount(
+            self.labels, weights=self.weights, minlength=self.nbins
+        ).astype(np.float64)
+        self.centers = self.mean(coords[:, self.keep])
+
+    def sums(self, values):
+        """Per-bin (weighted) sums of values with shape (N,) or (N, nvar)"""
+        values = np.asarray(values, dtype=np.float64)
+        flat = values.reshape(self.npts, int(np.prod(values.shape[1:])))
+        if self.weights is not None:
+            flat = flat * self.weights[:, np.newaxis]
+
+        if self.structured:
+            dense = np.empty_like(flat)
+            dense[self.lattice_index] = flat
+            dense = dense.reshape(self.shape + (-1,))
+            order = self.keep + self.homogeneous + [len(self.shape)]
+            res = (
+                dense.transpose(order)
+                .reshape(self.nbins, -1, flat.shape[1])
+                .sum(axis=1)
+            )
+        else:
+            res = np.column_stack(
+                [
+                    np.bincount(self.labels, weights=flat[:, j], minlength=self.nbins)
+                    for j in range(flat.shape[1])
+                ]
+            ).reshape(self.nbins, flat.shape[1])
+
+        return res.reshape((self.nbins,) + values.shape[1:])
+
+    def mean(self, values):
+        """Per-bin means of values"""
+        sums = self.sums(values)
+        return sums / self.counts.reshape((-1,) + (1,) * (sums.ndim - 1))
+
+    def reduce(self, values):
+        """Bin centers, counts, sums and first two moments of values"""
+        values = np.asarray(values, dtype=np.float64)
+        sums = self.sums(values)
+        counts = self.counts.reshape((-1,) + (1,) * (sums.ndim - 1))
+        mean = sums / counts
+        return {
+            "centers": self.centers,
+            "counts": self.counts,
+            "sums": sums,
+            "mean": mean,
+            "var": self.sums((values - mean[self.labels]) ** 2) / counts,
+        }
+
+
+# ========================================================================
+def fold_halves(data, axis, center, flip=()):
+    """Mirror the rows beyond center onto the lower half
+
+    Rows with data[:, axis] > center are reflected about center and the
+    columns in flip change sign (e.g. the wall-normal velocity and the
+    shear stress containing it). On a symmetric mesh the mirrored points
+    fall on the lines of the lower half, so a homogeneous average of the
+    folded data averages both halves together.
+    """
+    out = np.array(data, dtype=np.float64)
+    upper = out[:, axis] > center
+    out[upper, axis] = 2.0 * center - out[upper, axis]
+    for col in flip:
+        out[upper, col] = -out[upper, col]
+    return out
+
+
+# ========================================================================
+def slab_rows(x, centers, half_width):
+    """Rows of the points in the slabs centers +/- half_width
+
+    x is sorted once and the slab bounds are found with searchsorted,
+    so all slabs are selected in a single pass. Slabs may overlap.
+    Returns the slab index and the row of every (slab, point) pair.
+    """
+    order = np.argsort(x, kind="stable")
+    xs = np.asarray(x)[order]
+    lo = np.searchsorted(xs, np.asarray(centers) - half_width, side="left")
+    hi = np.searchsorted(xs, np.asarray(centers) + half_width, side="right")
+    counts = hi - lo
+    slab = np.repeat(np.arange(len(counts)), counts)
+    first = np.repeat(lo - (np.cumsum(counts) - counts), counts)
+    return slab, order[np.arange(counts.sum()) + first]
+
+
+# ========================================================================
+def slab_sums(data, lines, nlines, centers, half_width, weights=None):
+    """Sums and counts of data rows per (x slab, line)
+
+    The x coordinate is the first column of data and lines labels each
+    row with one of nlines lines across the slabs (e.g. z lines). The
+    sums are returned with shape (nslabs, nlines, ncols) and the counts
+    are appended as a last column. With weights the rows are weighted
+    and the last column holds the total weights.
+    """
+    slab, rows = slab_rows(data[:, 0], centers, half_width)
+    labels = slab * nlines + lines[rows]
+    nbins = len(centers) * nlines
+    wts = np.ones(len(rows)) if weights is None else np.asarray(weights)[rows]
+    res = np.zeros((nbins, data.shape[1] + 1))
+    for j in range(data.shape[1]):
+        res[:, j] = np.bincount(labels, weights=data[rows, j] * wts, minlength=nbins)
+    res[:, -1] = np.bincount(labels, weights=wts, minlength=nbins)
+    return res.reshape(len(centers), nlines, -1)
@@ -0,0 +1,82 @@
+# ========================================================================
+#
+# Imports
+#
+# ========================================================================
+import numpy as np
+
+
+# ========================================================================
+#
+# Define constants
+#
+# ========================================================================
+# Nodal samples averaged for the budgets: velocity, pressure, the
+# products needed for the fluxes and the velocity gradient tensor
+sample_names = (
+    ["u", "v", "w", "p", "uiui", "uw", "vw", "ww", "uiuiw", "pw", "gijgij"]
+    + [f"d{a}d{b}" for a in "uvw" for b in "xyz"]
+)
+kbal_names = ["dissip", "produc", "p-strain", "p-diff", "t-diff", "v-diff", "bal"]
+
+
+# ========================================================================
+#
+# Function definitions
+#
+# ========================================================================
+def budget_samples(values, grads):
+    """Nodal samples for the budgets, shape (nnodes, len(sample_names))
+
+    values has columns (u, v, w, p) and grads[:, i, j] is the derivative
+    of velocity component i in direction j.
+    """
+    vel = values[:, :3]
+    uiui = (vel ** 2).sum(axis=1)
+    w = vel[:, 2]
+    return np.column_stack(
+        (
+            values[:, :4],
+            uiui,
+            vel * w[:, np.newaxis],
+            uiui * w,
+            values[:, 3] * w,
+            (grads ** 2).sum(axis=(1, 2)),
+            grads.reshape(-1, 9),
+        )
+    )
+
+
+# ========================================================================
+def tke_budget(z, mean, nu):
+    """Resolved turbulent kinetic energy budget from averaged samples
+
+    mean holds the time and homogeneous averages of the samples (rows
+    are wall-normal stations at z, columns follow sample_names).
+    Returns the kbal_names terms (each with len(z) values) and k, using
+    the chan180 sign conventions: dissipation is negative and the
+    pressure-strain term vanishes for k.
+    """
+    col = {name: mean[:, j] for j, name in enumerate(sample_names)}
+    vel = np.column_stack((col["u"], col["v"], col["w"]))
+    vsq = (vel ** 2).sum(axis=1)
+    uiw = np.column_stack((col["uw"], col["vw"], col["ww"]))
+    W = col["w"]
+
+    k = 0.5 * (col["uiui"] - vsq)
+    stress = uiw - vel * W[:, np.newaxis]
+    flux = 0.5 * (col["uiuiw"] - W * col["uiui"] - 2.0 * (vel * uiw).sum(axis=1)) + vsq * W
+    pflux = col["pw"] - col["p"] * W
+    dveldz = np.gradient(vel, z, axis=0)
+    meangrad = mean[:, len(sample_names) - 9 :]
+
+    terms = {
+        "dissip": -nu * (col["gijgij"] - (meangrad ** 2).sum(axis=1)),
+        "produc": -(stress * dveldz).sum(axis=1),
+        "p-strain": np.zeros(len(z)),
+        "p-diff": -np.gradient(pflux, z),
+        "t-diff": -np.gradient(flux, z),
+        "v-diff": nu * np.gradient(np.gradient(k, z), z),
+    }
+    terms["bal"] = sum(terms.values())
+    return terms, k
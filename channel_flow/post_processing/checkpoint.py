@@ -0,0 +1,94 @@
+# ========================================================================
+#
+# Imports
+#
+# ========================================================================
+import os
+import numpy as np
+from mpi4py import MPI
+
+
+# ========================================================================
+#
+# Function definitions
+#
+# ========================================================================
+def fingerprint(comm, coords):
+    """Fingerprint of the local nodes: rank count, node counts and checksums"""
+    fp = [comm.Get_size()]
+    for xyz in coords:
+        fp += [xyz.shape[0], xyz.sum(), np.abs(xyz).sum(), (xyz ** 2).sum()]
+    return np.array(fp, dtype=np.float64)
+
+
+# ========================================================================
+#
+# Classes
+#
+# ========================================================================
+class Checkpoint:
+    """Averaging state saved next to the post-processing output
+
+    Each rank writes its own nodal statistics to a compressed npz file
+    in cdir. The file holds named parts, each a dictionary of arrays
+    (e.g. a moment accumulator state, running sums, counts and the time
+    steps already folded in), and a fingerprint of the local nodes so
+    that a checkpoint is only reused on the same mesh and decomposition.
+    The times of each part must also be the same on all ranks. All
+    methods are collective.
+    """
+
+    def __init__(self, comm, cdir, coords):
+        self.comm = comm
+        self.cdir = cdir
+        self.fname = os.path.join(cdir, f"rank{comm.Get_rank():05d}.npz")
+        self.fingerprint = fingerprint(comm, coords)
+
+    def exists(self):
+        return self.comm.allreduce(os.path.isfile(self.fname), op=MPI.LAND)
+
+    def load(self):
+        """Return the saved parts as {part: {key: array}}"""
+        with np.load(self.fname) as dat:
+            same = dat["fingerprint"].shape == self.fingerprint.shape and np.allclose(
+                dat["fingerprint"], self.fingerprint
+            )
+            if not self.comm.allreduce(same, op=MPI.LAND):
+                raise RuntimeError(
+                    f"Checkpoint in {self.cdir} does not match this mesh and decomposition"
+                )
+            parts = {}
+            for key in dat.files:
+                if "__" in key:
+                    part, name = key.split("__", 1)
+                    parts.setdefault(part, {})[name] = dat[key]
+
+        # Every rank must have folded in the same time steps, which is
+        # not the case after a save interrupted on some of the ranks
+        times = {part: val["times"] for part, val in parts.items() if "times" in val}
+        ref = self.comm.bcast(times, root=0)
+        same = ref.keys() == times.keys() and all(
+            np.array_equal(ref[part], val) for part, val in times.items()
+        )
+        if not self.comm.allreduce(same, op=MPI.LAND):
+            raise RuntimeError(
+                f"Checkpoint in {self.cdir} holds different time steps on different ranks"
+            )
+        return parts
+
+    def save(self, **parts):
+        """Save dictionaries of arrays, skipping entries that are None"""
+        if self.comm.Get_rank() == 0:
+            os.makedirs(self.cdir, exist_ok=True)
+        self.comm.Barrier()
+
+        data = {"fingerprint": self.fingerprint}
+        for part, arrays in parts.items():
+            for name, val in arrays.items():
+                if val is not None:
+                    data[f"{part}__{name}"] = np.asarray(val)
+
+        tmp = self.fname + ".tmp.npz"
+        np.savez_compressed(tmp, **data)
+        os.replace(tmp, self.fname)
+        self.comm.Barrier()
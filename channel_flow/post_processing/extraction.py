@@ -0,0 +1,131 @@
+# ========================================================================
+#
+# Imports
+#
+# ========================================================================
+import numpy as np
+import stk
+
+
+# ========================================================================
+#
+# Classes
+#
+# ========================================================================
+class NodeGatherPlan:
+    """Cached bucket layout for extracting nodal fields on a selector
+
+    The mesh does not change between time steps, so the bucket list,
+    the offset of each bucket in the flattened node arrays and the node
+    coordinates are computed once. Each call to gather then only copies
+    the field bucket views into a preallocated columnar buffer. To bound
+    memory on large meshes, gather can also copy one node range (a
+    bucket range from chunks) at a time into a buffer of that size.
+    """
+
+    def __init__(self, mesh, sel):
+        self.mesh = mesh
+        self.buckets = list(mesh.iter_buckets(sel, stk.StkRank.NODE_RANK))
+        sizes = np.array([bkt.size for bkt in self.buckets], dtype=int)
+        self.offsets = np.concatenate(([0], np.cumsum(sizes)))
+        self.nnodes = int(self.offsets[-1])
+        self._fields = {}
+        self._buffers = {}
+        self.coords = self._copy(mesh.meta.coordinate_field, np.zeros((self.nnodes, 3)))
+
+    def _field(self, name):
+        if name not in self._fields:
+            self._fields[name] = self.mesh.meta.get_field(name)
+        return self._fields[name]
+
+    def _copy(self, field, out, first=0, last=None):
+        last = len(self.buckets) if last is None else last
+        start = self.offsets[first]
+        for k in range(first, last):
+            bkt = self.buckets[k]
+            out[self.offsets[k] - start : self.offsets[k + 1] - start, :] = field.bkt_view(
+                bkt
+            ).reshape(bkt.size, -1)
+        return out
+
+    def chunks(self, max_nodes):
+        """Split the nodes in ranges of whole buckets
+
+        Returns a list of (rows, buckets) pairs, rows the slice of the
+        nodes in a range and buckets the (first, last) bucket range to
+        pass to gather. A range holds about max_nodes nodes (at most one
+        bucket more).
+        """
+        ids = self.offsets[:-1] // max(int(max_nodes), 1)
+        bounds = np.concatenate(
+            ([0], np.flatnonzero(np.diff(ids)) + 1, [len(self.buckets)])
+        )
+        return [
+            (slice(self.offsets[k0], self.offsets[k1]), (k0, k1))
+            for k0, k1 in zip(bounds[:-1], bounds[1:])
+            if k1 > k0
+        ]
+
+    def gather(self, fields, buckets=None):
+        """Copy the current values of fields into the plan buffer
+
+        fields maps field names to their number of components, e.g.
+        {"velocity": 3, "turbulent_ke": 1}. The returned array has
+        shape (nnodes, sum of components), or one row per node of the
+        bucket range buckets, and is overwritten by the next call with
+        the same fields, so copy it if it must persist.
+        """
+        first, last = (0, len(self.buckets)) if buckets is None else buckets
+        nrows = self.offsets[last] - self.offsets[first]
+        key = tuple(fields.items())
+        if key not in self._buffers or self._buffers[key].shape[0] < nrows:
+            self._buffers[key] = np.zeros((nrows, sum(fields.values())))
+        buf = self._buffers[key][:nrows]
+
+        col = 0
+        for name, ncomp in fields.items():
+            self._copy(self._field(name), buf[:, col : col + ncomp], first, last)
+            col += ncomp
+        return buf
+
+
+# ========================================================================
+class InputFields:
+    """Declare and read only the fields the extraction stages need
+
+    The mesh meta data must be read with auto_declare_fields=False.
+    Fields are given as dictionaries mapping field names to their number
+    of components, the same dictionaries passed to NodeGatherPlan.gather.
+    All fields must be declared before the bulk data is populated. A
+    stage then activates its fields before reading time steps, and
+    read_defined_input_fields only reads the activated fields. Stages
+    should be run with their field sets in increasing order (e.g. wall
+    quantities before interior quantities) since activated fields stay
+    active.
+    """
+
+    def __init__(self, mesh):
+        self.mesh = mesh
+        self.declared = {}
+        self.active = set()
+
+    def declare(self, *stages):
+        meta = self.mesh.meta
+        ndim = meta.spatial_dimension
+        for fields in stages:
+            for name, ncomp in fields.items():
+                if name in self.declared:
+                    continue
+                if ncomp == 1:
+                    field = meta.declare_scalar_field(name)
+                    field.add_to_part(meta.universal_part)
+                else:
+                    field = meta.declare_vector_field(name)
+                    field.add_to_part(meta.universal_part, ndim)
+                self.declared[name] = field
+
+    def activate(self, fields):
+        for name in fields:
+            if name not in self.active:
+                self.mesh.stkio.add_input_field(self.declared[name])
+                self.active.add(name)
@@ -0,0 +1,161 @@
+# ========================================================================
+#
+# Imports
+#
+# ========================================================================
+import numpy as np
+import scipy.sparse as sp
+import averaging
+import reduction
+
+
+# ========================================================================
+#
+# Function definitions
+#
+# ========================================================================
+def exchange(comm, dest, *arrays):
+    """Send the rows of arrays to the ranks in dest with one alltoall
+
+    Returns the received arrays, concatenated in source rank order, and
+    the source rank of each received row. Rows sent to the same rank
+    keep their order.
+    """
+    size = comm.Get_size()
+    order = np.argsort(dest, kind="stable")
+    splits = np.cumsum(np.bincount(dest, minlength=size))[:-1]
+    sent = [np.split(np.asarray(arr)[order], splits) for arr in arrays]
+    recv = comm.alltoall([tuple(s[r] for s in sent) for r in range(size)])
+    out = [np.concatenate([r[k] for r in recv]) for k in range(len(arrays))]
+    src = np.concatenate([np.full(len(r[0]), s, dtype=np.int64) for s, r in enumerate(recv)])
+    return out, src
+
+
+# ========================================================================
+def first_derivative(z):
+    """Three-point first derivative stencils on the sorted points z
+
+    Returns the offsets (relative to each point) and the coefficients,
+    both with shape (len(z), 3). Central on interior points, one-sided
+    on the end points, second order on nonuniform spacing.
+    """
+    n = len(z)
+    offsets = np.tile([-1, 0, 1], (n, 1))
+    offsets[0] = [0, 1, 2]
+    offsets[-1] = [-2, -1, 0]
+    idx = np.arange(n)[:, np.newaxis] + offsets
+    h1 = z[idx[:, 1]] - z[idx[:, 0]]
+    h2 = z[idx[:, 2]] - z[idx[:, 1]]
+
+    # Lagrange polynomial through the three points, differentiated at
+    # the point itself (first, middle or last of the stencil)
+    at = np.ones(n, dtype=int)
+    at[0], at[-1] = 0, 2
+    x0 = np.where(at == 0, 0.0, np.where(at == 1, h1, h1 + h2))
+    pts = np.column_stack((np.zeros(n), h1, h1 + h2))
+    coefs = np.zeros((n, 3))
+    for a in range(3):
+        others = [b for b in range(3) if b != a]
+        denom = (pts[:, a] - pts[:, others[0]]) * (pts[:, a] - pts[:, others[1]])
+        coefs[:, a] = (2.0 * x0 - pts[:, others[0]] - pts[:, others[1]]) / denom
+    return offsets, coefs
+
+
+# ========================================================================
+#
+# Classes
+#
+# ========================================================================
+class LatticeGradient:
+    """Nodal gradients on a distributed channel lattice
+
+    The nodes must form a tensor-product lattice that is uniform and
+    periodic in x and y and may be stretched in z, with walls at both z
+    ends. Second-order finite difference stencils (one-sided at the
+    walls) are assembled once into sparse matrices acting on the local
+    node values followed by halo values owned by other ranks. The
+    owners of the halo nodes are found once through a distributed
+    directory (lattice index modulo the number of ranks). Each gradient
+    evaluation is then one alltoall of the halo values and three sparse
+    products, linear in the number of nodes.
+
+    Nodes on duplicated periodic images are left out: gradients are
+    returned for the rows in self.rows only. The constructor and calls
+    are collective.
+    """
+
+    def __init__(self, comm, coords, lengths, tol=averaging.default_tol):
+        self.comm = comm
+        size = comm.Get_size()
+
+        ix, nx = reduction.periodic_line_labels(comm, coords[:, 0], lengths[0], tol)
+        iy, ny = reduction.periodic_line_labels(comm, coords[:, 1], lengths[1], tol)
+        iz, nz = reduction.global_line_labels(comm, coords[:, 2], tol)
+        zlines = reduction.global_line_positions(comm, coords[:, 2], iz, nz)
+        self.shape = (nx, ny, nz)
+
+        self.rows = np.flatnonzero((ix >= 0) & (iy >= 0))
+        ix, iy, iz = ix[self.rows], iy[self.rows], iz[self.rows]
+        nlocal = len(self.rows)
+        if comm.allreduce(nlocal) != nx * ny * nz:
+            raise RuntimeError("Gradients need a complete structured lattice")
+        lid = np.ravel_multi_index((ix, iy, iz), self.shape)
+
+        # Stencil columns (as lattice ids) and coefficients per direction
+        zoff, zcoef = first_derivative(zlines)
+        central = np.array([-1, 0, 1])
+        ix3, iy3, iz3 = (np.repeat(i[:, np.newaxis], 3, axis=1) for i in (ix, iy, iz))
+        uniform = np.tile([-0.5, 0.0, 0.5], (nlocal, 1))
+        stencils = [
+            (((ix3 + central) % nx, iy3, iz3), uniform * nx / lengths[0]),
+            ((ix3, (iy3 + central) % ny, iz3), uniform * ny / lengths[1]),
+            ((ix3, iy3, iz3 + zoff[iz]), zcoef[iz]),
+        ]
+        stencils = [
+            (np.ravel_multi_index(idx, self.shape), coefs) for idx, coefs in stencils
+        ]
+
+        # Register the local nodes with the directory and look up the
+        # owners of the halo nodes
+        (dir_lid, dir_pos), dir_rank = exchange(comm, lid % size, lid, np.arange(nlocal))
+        dir_order = np.argsort(dir_lid)
+        dir_lid = dir_lid[dir_order]
+
+        needed = np.unique(np.concatenate([cols.ravel() for cols, _ in stencils]))
+        halo = needed[~np.isin(needed, lid)]
+        (query,), asker = exchange(comm, halo % size, halo)
+        found = dir_order[np.searchsorted(dir_lid, query)]
+        (owner, owner_pos), _ = exchange(comm, asker, dir_rank[found], dir_pos[found])
+
+        # Answers arrive grouped by directory rank, in query order
+        halo = halo[np.argsort(halo % size, kind="stable")]
+
+        # Ask the owners for the halo values, which then arrive grouped by
+        # owner rank
+        (send_pos,), requester = exchange(comm, owner, owner_pos)
+        self.send = [send_pos[requester == r] for r in range(size)]
+        halo = halo[np.argsort(owner, kind="stable")]
+
+        # Sparse operators on [local values, halo values]
+        keys = np.concatenate((lid, halo))
+        key_order = np.argsort(keys)
+        self.ops = []
+        for cols, coefs in stencils:
+            cols = key_order[np.searchsorted(keys[key_order], cols.ravel())]
+            self.ops.append(
+                sp.csr_matrix(
+                    (coefs.ravel(), (np.repeat(np.arange(nlocal), 3), cols)),
+                    shape=(nlocal, nlocal + len(halo)),
+                )
+            )
+
+    def __call__(self, values):
+        """Gradients of values at self.rows, shape (nrows, nvar, 3)
+
+        values holds the nodal data (one row per node in coords).
+        """
+        values = np.asarray(values, dtype=np.float64)
+        local = values.reshape(values.shape[0], -1)[self.rows]
+        recv = self.comm.alltoall([local[idx] for idx in self.send])
+        ext = np.vstack([local] + [r.reshape(-1, local.shape[1]) for r in recv])
+        return np.stack([op @ ext for op in self.ops], axis=-1)
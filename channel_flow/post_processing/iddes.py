@@ -0,0 +1,111 @@
+# ========================================================================
+#
+# Imports
+#
+# ========================================================================
+import numpy as np
+import reduction
+
+
+# ========================================================================
+#
+# Define constants
+#
+# ========================================================================
+# Second moments needed for the stress partition
+partition_pairs = [("u", "w"), ("u", "u"), ("v", "v"), ("w", "w")]
+
+# Wall distance coefficient of the IDDES length scale (Shur et al. 2008)
+cw = 0.15
+
+
+# ========================================================================
+#
+# Function definitions
+#
+# ========================================================================
+def stress_partition(z, u, nut, k_model, cov, nu, utau):
+    """Resolved and modeled shear stress and kinetic energy per station
+
+    z is the distance from the wall and u, nut and k_model the mean
+    streamwise velocity, turbulent viscosity and modeled kinetic energy
+    on the stations. cov holds the resolved covariances in the order of
+    partition_pairs. The modeled shear stress is nut dU/dz, so both
+    stresses are positive near the bottom wall.
+    """
+    resolved = -cov[:, 0]
+    modeled = nut * np.gradient(u, z)
+    k_resolved = 0.5 * cov[:, 1:4].sum(axis=1)
+    total = resolved + modeled
+    k_total = k_resolved + k_model
+    return {
+        "z": z,
+        "yplus": z * utau / nu,
+        "uw_res": resolved,
+        "uw_mod": modeled,
+        "uw_res_frac": np.divide(
+            resolved, total, out=np.zeros_like(total), where=total != 0
+        ),
+        "k_res": k_resolved,
+        "k_mod": k_model,
+        "k_res_frac": np.divide(
+            k_resolved, k_total, out=np.zeros_like(k_total), where=k_total != 0
+        ),
+    }
+
+
+# ========================================================================
+def interface_height(z, resolved, modeled):
+    """First height where the resolved stress overtakes the modeled one
+
+    This marks where the hybrid model hands over from RANS to LES. Only
+    a strict sign change counts, so stations where both stresses vanish
+    (the wall) are skipped. The crossing is interpolated linearly
+    between stations, NaN if the resolved stress never goes from below
+    to above the modeled one.
+    """
+    diff = resolved - modeled
+    nonzero = np.flatnonzero(diff != 0)
+    d = diff[nonzero]
+    above = np.flatnonzero((d[1:] > 0) & (d[:-1] < 0))
+    if len(above) == 0:
+        return np.nan
+    i, j = nonzero[above[0]], nonzero[above[0] + 1]
+    return z[i] - diff[i] * (z[j] - z[i]) / (diff[j] - diff[i])
+
+
+# ========================================================================
+def length_scale(hmax, hwn, dw):
+    """IDDES subgrid length scale from the cell sizes and wall distance
+
+    Delta = min(max(Cw dw, Cw hmax, hwn), hmax), with hmax the largest
+    cell edge and hwn the wall-normal cell size. It grows with hmax, so
+    the extremes over a station follow from the extremes of hmax.
+    """
+    return np.minimum(np.maximum(np.maximum(cw * dw, cw * hmax), hwn), hmax)
+
+
+# ========================================================================
+def channel_diagnostics(
+    comm, coords, values, nu, tauw, origin, half_height, rho=1.0, root=0, weights=None
+):
+    """Stress partition per wall-normal station and interface y+ on root
+
+    values holds the nodal time averages of u, nut and k followed by the
+    covariances in partition_pairs. They are averaged over x and y on
+    each z line. tauw is the mean wall shear stress (only needed on
+    root), made kinematic with the density rho, and the interface is
+    searched in the lower half channel.
+    weights (e.g. nodal volumes) turn the averages into weighted ones.
+    Returns (None, None) on the other ranks.
+    """
+    stations = reduction.DistributedAverage(comm, coords, [2], weights=weights)
+    prof = stations.mean(values, root=root)
+    if prof is None:
+        return None, None
+    z = stations.centers[:, 0] - origin
+    utau = np.sqrt(tauw / rho)
+    diag = stress_partition(z, prof[:, 0], prof[:, 1], prof[:, 2], prof[:, 3:], nu, utau)
+    lower = z <= half_height
+    zi = interface_height(z[lower], diag["uw_res"][lower], diag["uw_mod"][lower])
+    return diag, zi * utau / nu
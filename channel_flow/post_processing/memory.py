@@ -0,0 +1,62 @@
+# ========================================================================
+#
+# Imports
+#
+# ========================================================================
+import numpy as np
+from scipy.io import netcdf_file
+
+
+# ========================================================================
+#
+# Define constants
+#
+# ========================================================================
+gib = 2.0 ** 30
+
+
+# ========================================================================
+#
+# Function definitions
+#
+# ========================================================================
+def exodus_num_nodes(fname):
+    """Number of nodes in the header of an Exodus file, None if unknown
+
+    Only the header is read. Files in the classic netCDF formats can be
+    read this way, HDF5-based (netCDF-4) files cannot.
+    """
+    try:
+        with netcdf_file(fname, "r", mmap=True) as f:
+            return int(f.dimensions["num_nodes"])
+    except (OSError, TypeError, ValueError, KeyError):
+        return None
+
+
+# ========================================================================
+def local_nodes(comm, mfile, auto_decomp):
+    """Projected number of nodes on this rank, before the bulk data is read
+
+    With auto_decomp the nodes of mfile are split evenly across the
+    ranks, otherwise each rank reads the header of its decomposed file
+    (mfile.<nranks>.<rank>). Returns None if the header cannot be read.
+    """
+    size, rank = comm.Get_size(), comm.Get_rank()
+    if auto_decomp:
+        nnodes = comm.bcast(exodus_num_nodes(mfile) if rank == 0 else None, root=0)
+        return None if nnodes is None else -(-nnodes // size)
+    return exodus_num_nodes(f"{mfile}.{size}.{rank:0{len(str(size))}d}")
+
+
+# ========================================================================
+def chunk_nodes(budget, fixed, per_node, nnodes):
+    """Largest node range that keeps fixed + per_node * range within budget
+
+    fixed is the memory held for the whole run and per_node the memory
+    per node of one range (gather buffers and temporaries), both in
+    bytes. The range is at least one node and at most nnodes. Without a
+    budget all nodes are processed at once.
+    """
+    if budget is None:
+        return max(nnodes, 1)
+    return int(np.clip((budget - fixed) // max(per_node, 1), 1, max(nnodes, 1)))
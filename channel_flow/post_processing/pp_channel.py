@@ -5,11 +5,18 @@
 # ========================================================================
 import argparse
 import os
+import sys
 import numpy as np
 import scipy.spatial.qhull as qhull
 import pandas as pd
 from mpi4py import MPI
 import stk
+import averaging
+import extraction
+import probe
+import profiles
+import reduction
+import timesteps
 from scipy.interpolate import griddata
 
 # ========================================================================
@@ -21,6 +28,8 @@ channel_xplanes = [2, 4, 6]
 dx              = 0.05
 ninterp         = 201
 interiorname    = "fluid-HEX"  # "interior-hex"
+Lz              = 2.0
+Oz              = 0.0
 
 # ========================================================================
 #
@@ -75,6 +84,11 @@ if __name__ == "__main__":
         type=str,
     )
     parser.add_argument("--auto_decomp", help="Auto-decomposition", action="store_true")
+    parser.add_argument(
+        "--probe",
+        help="Report the time steps and fields of the mesh and exit before loading bulk data",
+        action="store_true",
+    )
     parser.add_argument(
         "-v",
         "--vel_name",
@@ -94,10 +108,35 @@ if __name__ == "__main__":
         type=float,
         default=1.2,
     )
+    parser.add_argument(
+        "--distributed",
+        help="Reduce per-bin sums across ranks instead of gathering nodes to rank 0",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--interp",
+        help="Profile interpolation (griddata is the 2D reference mode)",
+        choices=["cubic", "linear", "griddata"],
+        default="cubic",
+    )
+    parser.add_argument(
+        "--weighted",
+        help="Weight the spatial averages by lumped nodal volumes and wall face areas",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--fold",
+        help="Fold the upper half channel onto the lower half and average both walls",
+        action="store_true",
+    )
     args = parser.parse_args()
 
     fdir = os.path.dirname(args.mfile)
 
+    # Fields read by each extraction stage
+    wall_fields = {"tau_wall": 1}
+    interior_fields = {args.vel_name: 3}
+
     comm = MPI.COMM_WORLD
     size = comm.Get_size()
     rank = comm.Get_rank()
@@ -106,85 +145,90 @@ if __name__ == "__main__":
 
     mesh = stk.StkMesh(par)
     printer("Reading meta data for mesh: ", args.mfile)
-    mesh.read_mesh_meta_data(args.mfile, auto_decomp=args.auto_decomp)
+    mesh.read_mesh_meta_data(
+        args.mfile, auto_decomp=args.auto_decomp, auto_declare_fields=False
+    )
+    fields = extraction.InputFields(mesh)
+    fields.declare(wall_fields, interior_fields)
     printer("Done reading meta data")
 
+    # Step selection and fields checked from the mesh header (or the
+    # meta data) before any bulk data is read
+    header = probe.probe_mesh(comm, args.mfile, args.auto_decomp)
+    tsteps = np.array(mesh.stkio.time_steps) if header is None else header["times"]
+    errors = probe.report(
+        printer,
+        tsteps,
+        args.navg,
+        args.flowthrough * args.factor,
+        header,
+        stages=(wall_fields, interior_fields),
+    )
+    if args.probe or errors:
+        sys.exit(1 if errors else 0)
+
     printer("Loading bulk data for mesh: ", args.mfile)
     mesh.populate_bulk_data()
     printer("Done reading bulk data")
 
-    num_time_steps = mesh.stkio.num_time_steps
-    max_time = mesh.stkio.max_time
-    tsteps = np.array(mesh.stkio.time_steps)
-    printer(f"""Num. time steps = {num_time_steps}\nMax. time step  = {max_time}""")
-
     # Figure out the times over which to average
-    tmp_tavg = np.sort(
-        tsteps[-1] - args.flowthrough * args.factor * np.arange(args.navg)
+    tsteps = np.array(mesh.stkio.time_steps)
+    tavg, tavg_instantaneous = timesteps.select_steps(
+        tsteps, args.navg, args.flowthrough * args.factor
     )
-    dist = np.abs(np.array(tsteps)[:, np.newaxis] - tmp_tavg)
-    idx = dist.argmin(axis=0)
-    tavg = tsteps[idx]
-    tavg_instantaneous = tsteps[idx[0] :]
-    printer("Averaging the following steps:")
-    printer(tavg)
 
     # Extract time and spanwise average tau_wall on wall
-    tw_data = None
+    twnames = ["x", "y", "z", "tauw"]
+    walls = mesh.meta.get_part("wall_bottom")
+    if args.fold:
+        walls = walls | mesh.meta.get_part("wall_top")
+    wall_plan = extraction.NodeGatherPlan(mesh, walls & mesh.meta.locally_owned_part)
+    tw_sum = np.zeros((wall_plan.nnodes, 1))
+    fields.activate(wall_fields)
     for tstep in tavg_instantaneous:
         ftime, missing = mesh.stkio.read_defined_input_fields(tstep)
         printer(f"Loading tau_wall fields for time: {ftime}")
-
-        coords = mesh.meta.coordinate_field
-        wall = mesh.meta.get_part("wall_bottom")
-        sel = wall & mesh.meta.locally_owned_part
-        tauw = mesh.meta.get_field("tau_wall")
-        names = ["x", "y", "z", "tauw"]
-        nnodes = sum(bkt.size for bkt in mesh.iter_buckets(sel, stk.StkRank.NODE_RANK))
-
-        cnt = 0
-        data = np.zeros((nnodes, len(names)))
-        for bkt in mesh.iter_buckets(sel, stk.StkRank.NODE_RANK):
-            xyz = coords.bkt_view(bkt)
-            tw = tauw.bkt_view(bkt)
-            data[cnt : cnt + bkt.size, :] = np.hstack((xyz, tw.reshape(-1, 1)))
-            cnt += bkt.size
-
-        if tw_data is None:
-            tw_data = np.zeros(data.shape)
-        tw_data += data / len(tavg_instantaneous)
-
-    lst = comm.gather(tw_data, root=0)
-    comm.Barrier()
-    if rank == 0:
-        df = pd.DataFrame(np.vstack(lst), columns=names)
-        tw = df.groupby("x", as_index=False).mean().sort_values(by=["x"])
-        twname = os.path.join(fdir, "tw.dat")
-        tw.to_csv(twname, index=False)
+        tw_sum += wall_plan.gather(wall_fields)
+    tw_sum /= len(tavg_instantaneous)
 
     # Extract (average) velocity data
-    vel_data = None
+    names = ["x", "y", "z", "u", "v", "w"]
+    plan = extraction.NodeGatherPlan(
+        mesh, mesh.meta.get_part(interiorname) & mesh.meta.locally_owned_part
+    )
+    vel_sum = np.zeros((plan.nnodes, len(names) - 3))
+    fields.activate(interior_fields)
     for tstep in tavg:
         ftime, missing = mesh.stkio.read_defined_input_fields(tstep)
         printer(f"Loading {args.vel_name} fields for time: {ftime}")
+        vel_sum += plan.gather(interior_fields)
+    vel_sum /= len(tavg)
+
+    # Lumped nodal volumes and wall face areas, computed once for all
+    # the averages below
+    wall_wts, vol_wts = None, None
+    if args.weighted:
+        wall_wts = reduction.dual_volumes(comm, wall_plan.coords[:, :2])
+        vol_wts = reduction.dual_volumes(comm, plan.coords)
+
+    tw_data = np.hstack((wall_plan.coords, tw_sum))
+    if args.fold:
+        tw_data = averaging.fold_halves(tw_data, 2, Oz + 0.5 * Lz)
+    wall_mean = reduction.homogeneous_mean(
+        comm, tw_data, [0], distributed=args.distributed, weights=wall_wts
+    )
+    comm.Barrier()
+    if rank == 0:
+        tw = pd.DataFrame(wall_mean, columns=twnames)
+        twname = os.path.join(fdir, "tw.dat")
+        tw.to_csv(twname, index=False)
 
-        interior = mesh.meta.get_part(interiorname)
-        sel = interior & mesh.meta.locally_owned_part
-        velocity = mesh.meta.get_field(args.vel_name)
-        names = ["x", "y", "z", "u", "v", "w"]
-        nnodes = sum(bkt.size for bkt in mesh.iter_buckets(sel, stk.StkRank.NODE_RANK))
-
-        cnt = 0
-        data = np.zeros((nnodes, len(names)))
-        for bkt in mesh.iter_buckets(sel, stk.StkRank.NODE_RANK):
-            xyz = coords.bkt_view(bkt)
-            vel = velocity.bkt_view(bkt)
-            data[cnt : cnt + bkt.size, :] = np.hstack((xyz, vel))
-            cnt += bkt.size
-
-        if vel_data is None:
-            vel_data = np.zeros(data.shape)
-        vel_data += data / len(tavg)
+    vel_data = np.hstack((plan.coords, vel_sum))
+    if args.fold:
+        # The wall-normal velocity changes sign across the centerplane
+        vel_data = averaging.fold_halves(
+            vel_data, 2, Oz + 0.5 * Lz, flip=[names.index("w")]
+        )
 
     # Subset the velocities on planes
     #dx = 0.05 * 4
@@ -193,32 +237,44 @@ if __name__ == "__main__":
     for x in channel_xplanes:
         print(" === x=%f ==="%x)
         # subset the data around the plane of interest
-        sub = vel_data[(x - dx <= vel_data[:, 0]) & (vel_data[:, 0] <= x + dx), :]
+        inside = (x - dx <= vel_data[:, 0]) & (vel_data[:, 0] <= x + dx)
+        sub = vel_data[inside, :]
 
-        lst = comm.gather(sub, root=0)
+        plane_mean = reduction.homogeneous_mean(
+            comm,
+            sub,
+            [0, 2],
+            distributed=args.distributed,
+            weights=None if vol_wts is None else vol_wts[inside],
+        )
 
         comm.Barrier()
         if rank == 0:
             xi = np.array([x])
-            df = (
-                pd.DataFrame(np.vstack(lst), columns=names)
-                .groupby(["x", "z"], as_index=False)
-                .mean()
-                .sort_values(by=["x", "z"])
-            )
+            df = pd.DataFrame(plane_mean, columns=names)
             zmin, zmax = df.z.min(), df.z.max() #utilities.hill(xi)[0], df.y.max()
             #print("zmin, zmax = %e,%e"%(zmin, zmax))
             zi = np.linspace(zmin, zmax, ninterp)
 
-            umean = griddata(
-                (df.x, df.z), df.u, (xi[None, :], zi[:, None]), method="cubic"
-            ).flatten()
-            vmean = griddata(
-                (df.x, df.z), df.v, (xi[None, :], zi[:, None]), method="cubic"
-            ).flatten()
-            wmean = griddata(
-                (df.x, df.z), df.w, (xi[None, :], zi[:, None]), method="cubic"
-            ).flatten()
+            if args.interp == "griddata":
+                umean = griddata(
+                    (df.x, df.z), df.u, (xi[None, :], zi[:, None]), method="cubic"
+                ).flatten()
+                vmean = griddata(
+                    (df.x, df.z), df.v, (xi[None, :], zi[:, None]), method="cubic"
+                ).flatten()
+                wmean = griddata(
+                    (df.x, df.z), df.w, (xi[None, :], zi[:, None]), method="cubic"
+                ).flatten()
+            else:
+                umean, vmean, wmean = profiles.resample_profile(
+                    x,
+                    df.x.values,
+                    df.z.values,
+                    df[["u", "v", "w"]].values,
+                    zi,
+                    method=args.interp,
+                ).T
 
             # Old way:
             # zi = np.unique(df.z)
@@ -0,0 +1,208 @@
+# ========================================================================
+#
+# Imports
+#
+# ========================================================================
+import argparse
+import os
+import sys
+import numpy as np
+from mpi4py import MPI
+import stk
+import budgets
+import extraction
+import gradients
+import probe
+import reduction
+import spectra
+import timesteps
+
+# ========================================================================
+#
+# Define constants
+#
+# ========================================================================
+Lx              = 8.0
+Ly              = 3.0
+Lz              = 2.0
+Oz              = 0.0
+
+# ========================================================================
+#
+# Functions
+#
+# ========================================================================
+def p0_printer(par):
+    iproc = par.rank
+
+    def printer(*args, **kwargs):
+        if iproc == 0:
+            print(*args, **kwargs)
+
+    return printer
+
+
+# ========================================================================
+#
+# Main
+#
+# ========================================================================
+if __name__ == "__main__":
+
+    # Parse arguments
+    parser = argparse.ArgumentParser(
+        description="Resolved turbulent kinetic energy budget"
+    )
+    parser.add_argument(
+        "-m",
+        "--mfile",
+        help="Root name of files to postprocess",
+        required=True,
+        type=str,
+    )
+    parser.add_argument("--auto_decomp", help="Auto-decomposition", action="store_true")
+    parser.add_argument(
+        "--probe",
+        help="Report the time steps and fields of the mesh and exit before loading bulk data",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-v",
+        "--vel_name",
+        help="Name of the velocity field",
+        default="velocity",
+        type=str,
+    )
+    parser.add_argument(
+        "-navg", help="Number of times to average", default=10, type=int
+    )
+    parser.add_argument(
+        "--flowthrough", help="Flowthrough time (L/u)", default=0.4, type=float
+    )
+    parser.add_argument(
+        "--factor",
+        help="Factor of flowthrough time between time steps used in average",
+        type=float,
+        default=1.2,
+    )
+    parser.add_argument(
+        "-i",
+        "--interiorname",
+        help="Name of interior block (i.e. fluid-hex)",
+        type=str,
+        default="fluid-hex",
+    )
+    parser.add_argument(
+        "--viscosity", help="Kinematic viscosity", required=True, type=float
+    )
+    parser.add_argument("--density", help="Density", default=1.0, type=float)
+    args = parser.parse_args()
+
+    fdir = os.path.dirname(args.mfile)
+    bdir = os.path.join(fdir, "balances")
+
+    # Fields read by each extraction stage
+    wall_fields = {"tau_wall": 1}
+    budget_fields = {args.vel_name: 3, "pressure": 1}
+
+    comm = MPI.COMM_WORLD
+    rank = comm.Get_rank()
+    par = stk.Parallel.initialize()
+    printer = p0_printer(par)
+
+    mesh = stk.StkMesh(par)
+    printer("Reading meta data for mesh: ", args.mfile)
+    mesh.read_mesh_meta_data(
+        args.mfile, auto_decomp=args.auto_decomp, auto_declare_fields=False
+    )
+    fields = extraction.InputFields(mesh)
+    fields.declare(wall_fields, budget_fields)
+    printer("Done reading meta data")
+
+    # Step selection and fields checked from the mesh header (or the
+    # meta data) before any bulk data is read
+    header = probe.probe_mesh(comm, args.mfile, args.auto_decomp)
+    tsteps = np.array(mesh.stkio.time_steps) if header is None else header["times"]
+    errors = probe.report(
+        printer,
+        tsteps,
+        args.navg,
+        args.flowthrough * args.factor,
+        header,
+        stages=(wall_fields, budget_fields),
+    )
+    if args.probe or errors:
+        sys.exit(1 if errors else 0)
+
+    printer("Loading bulk data for mesh: ", args.mfile)
+    mesh.populate_bulk_data()
+    printer("Done reading bulk data")
+
+    tsteps = np.array(mesh.stkio.time_steps)
+    tavg, tavg_instantaneous = timesteps.select_steps(
+        tsteps, args.navg, args.flowthrough * args.factor
+    )
+
+    # Friction velocity from the mean wall shear stress
+    wall_plan = extraction.NodeGatherPlan(
+        mesh, mesh.meta.get_part("wall_bottom") & mesh.meta.locally_owned_part
+    )
+    tw_sum = 0.0
+    fields.activate(wall_fields)
+    for tstep in tavg_instantaneous:
+        ftime, missing = mesh.stkio.read_defined_input_fields(tstep)
+        printer(f"Loading tau_wall fields for time: {ftime}")
+        tw_sum += wall_plan.gather(wall_fields).sum()
+    tw_sum = comm.allreduce(tw_sum, op=MPI.SUM)
+    nwall = comm.allreduce(wall_plan.nnodes, op=MPI.SUM)
+    utau = np.sqrt(tw_sum / (nwall * len(tavg_instantaneous)) / args.density)
+    h = 0.5 * Lz
+    retau = utau * h / args.viscosity
+    printer(f"u_tau = {utau}, Re_tau = {retau}")
+
+    # Gradient operators and wall-normal stations, built once
+    plan = extraction.NodeGatherPlan(
+        mesh, mesh.meta.get_part(args.interiorname) & mesh.meta.locally_owned_part
+    )
+    grad = gradients.LatticeGradient(comm, plan.coords, [Lx, Ly])
+    stations = reduction.DistributedAverage(comm, plan.coords[grad.rows], [2])
+
+    # Accumulate the budget samples (kinematic pressure)
+    scale = np.array([1.0, 1.0, 1.0, 1.0 / args.density])
+    sums = np.zeros((stations.nbins, len(budgets.sample_names)))
+    fields.activate(budget_fields)
+    for tstep in tavg:
+        ftime, missing = mesh.stkio.read_defined_input_fields(tstep)
+        printer(f"Loading {args.vel_name} and pressure fields for time: {ftime}")
+        values = plan.gather(budget_fields)
+        samples = budgets.budget_samples(
+            values[grad.rows] * scale, grad(values[:, :3])
+        )
+        sums += stations.local_sums(samples)
+    sums = reduction.sum_to_root(comm, sums)
+
+    # Budget of the lower half channel in wall units
+    if rank == 0:
+        mean = sums / (stations.counts[:, np.newaxis] * len(tavg))
+        z = stations.centers[:, 0]
+        terms, k = budgets.tke_budget(z, mean, args.viscosity)
+        lower = z - Oz <= h + 1e-6 * h
+        y = z[lower] - Oz
+        os.makedirs(bdir, exist_ok=True)
+        spectra.write_dns_layout(
+            os.path.join(bdir, "kbal"),
+            np.column_stack(
+                [y / h, y * utau / args.viscosity]
+                + [
+                    terms[name][lower] * args.viscosity / utau ** 4
+                    for name in budgets.kbal_names
+                ]
+            ),
+            ["y", "y+"] + budgets.kbal_names,
+            [
+                "IDDES resolved terms in the balance equation for kinetic energy",
+                f"Normalization: U_tau, nu/U_tau. Mesh: {args.mfile}",
+                "",
+                f"ny = {np.count_nonzero(lower)},  Re = {retau:.2f}",
+            ],
+        )
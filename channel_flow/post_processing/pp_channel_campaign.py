@@ -0,0 +1,266 @@
+# ========================================================================
+#
+# Imports
+#
+# ========================================================================
+import argparse
+import glob
+import os
+import shlex
+import subprocess
+import sys
+import time
+import numpy as np
+import pandas as pd
+import memory
+
+# ========================================================================
+#
+# Define constants
+#
+# ========================================================================
+scriptpath      = os.path.abspath(os.path.dirname(__file__))
+Lz              = 2.0
+Oz              = 0.0
+extraction      = "pp_channel_xavg.py"
+outputs         = ["tw.dat", "profiles.dat", "xavg.dat", "rij_profiles.dat", "rij_xavg.dat"]
+case_options    = {"navg": "-navg", "flowthrough": "--flowthrough", "factor": "--factor"}
+
+# ========================================================================
+#
+# Functions
+#
+# ========================================================================
+def read_manifest(fname):
+    """Cases of a campaign manifest
+
+    The manifest is a CSV file with one row per case and the columns
+    name, mfile and viscosity. The optional columns are:
+    - ranks;
+    - density;
+    - navg, flowthrough and factor;
+    - args, extra options passed to the extraction as one string.
+    Blank entries fall back to the defaults. Relative mesh paths are
+    relative to the manifest.
+    """
+    cases = pd.read_csv(fname, comment="#", skipinitialspace=True, dtype={"args": str})
+    missing = {"name", "mfile", "viscosity"} - set(cases.columns)
+    if missing:
+        raise ValueError(f"Manifest {fname} is missing the columns {sorted(missing)}")
+    root = os.path.dirname(os.path.abspath(fname))
+    cases["mfile"] = [os.path.normpath(os.path.join(root, m)) for m in cases.mfile]
+    for col in ["ranks", "density", "args"] + list(case_options):
+        if col not in cases:
+            cases[col] = np.nan
+    cases["density"] = cases.density.fillna(1.0)
+    cases["args"] = cases.args.fillna("")
+    return cases
+
+
+# ========================================================================
+def up_to_date(mfile):
+    """True if all the extraction outputs are newer than the mesh files
+
+    The mesh files are mfile itself (auto-decomposed runs) and its
+    decomposed pieces mfile.<nranks>.<rank>.
+    """
+    fdir = os.path.dirname(mfile)
+    results = [f for f in [mfile] + glob.glob(mfile + ".*") if os.path.isfile(f)]
+    products = [os.path.join(fdir, f) for f in outputs]
+    if not results or not all(os.path.isfile(f) for f in products):
+        return False
+    return min(os.path.getmtime(f) for f in products) >= max(
+        os.path.getmtime(f) for f in results
+    )
+
+
+# ========================================================================
+def decomposed(mfile, ranks):
+    """True if mfile has decomposed pieces for ranks ranks"""
+    return os.path.isfile(f"{mfile}.{ranks}.{0:0{len(str(ranks))}d}")
+
+
+# ========================================================================
+def case_ranks(case, pool, nodes_per_rank):
+    """Rank count of a case
+
+    Taken from the manifest, else from an existing decomposition of the
+    mesh, else from the mesh size. Only the last two are capped at pool.
+    """
+    if np.isfinite(case.ranks):
+        return int(case.ranks)
+    pieces = glob.glob(case.mfile + ".*.*")
+    counts = {p[len(case.mfile) + 1 :].split(".")[0] for p in pieces}
+    ranks = [
+        int(n) for n in counts if n.isdigit() and int(n) <= pool and decomposed(case.mfile, n)
+    ]
+    if ranks:
+        return max(ranks)
+    nnodes = memory.exodus_num_nodes(case.mfile)
+    if nnodes is None:
+        return pool
+    return int(np.clip(-(-nnodes // nodes_per_rank), 1, pool))
+
+
+# ========================================================================
+def extraction_command(case, ranks, launcher, extra):
+    """Command line of the pp_channel_xavg.py extraction of one case"""
+    cmd = shlex.split(launcher.format(ranks=ranks))
+    cmd += [sys.executable, os.path.join(scriptpath, extraction), "-m", case.mfile]
+    if not decomposed(case.mfile, ranks):
+        cmd += ["--auto_decomp"]
+    for col, opt in case_options.items():
+        val = getattr(case, col)
+        if np.isfinite(val):
+            cmd += [opt, str(int(val)) if float(val).is_integer() else repr(float(val))]
+    return cmd + shlex.split(extra) + shlex.split(case.args)
+
+
+# ========================================================================
+def run_pool(jobs, pool, poll=1.0):
+    """Run jobs on a pool of ranks, largest first
+
+    jobs is a list of (name, ranks, command, log file). A job starts
+    as soon as enough ranks are free (a job larger than the pool runs
+    alone). Returns the exit code per job.
+    """
+    waiting = sorted(jobs, key=lambda job: -job[1])
+    running = {}
+    codes = {}
+    free = pool
+    while waiting or running:
+        for job in list(waiting):
+            name, ranks, cmd, log = job
+            if ranks > free and free < pool:
+                continue
+            print(f"Starting {name} on {ranks} ranks: {' '.join(cmd)}")
+            with open(log, "w") as f:
+                proc = subprocess.Popen(cmd, stdout=f, stderr=subprocess.STDOUT)
+            running[name] = (proc, ranks)
+            waiting.remove(job)
+            free -= ranks
+        time.sleep(poll if running else 0.0)
+        for name, (proc, ranks) in list(running.items()):
+            if proc.poll() is not None:
+                codes[name] = proc.returncode
+                code = proc.returncode
+                print(f"Finished {name}: " + ("done" if code == 0 else f"failed ({code})"))
+                free += ranks
+                del running[name]
+    return codes
+
+
+# ========================================================================
+def consolidate(cases):
+    """Wall-normal statistics of all cases in one long table
+
+    Reads the x-averaged profiles, Reynolds stresses and wall shear
+    stress written next to each mesh and adds the case name, viscosity,
+    friction velocity, Re_tau and wall units. The lower and upper half
+    channels are kept, z+ is the distance to the bottom wall.
+    """
+    tables = []
+    for case in cases.itertuples():
+        fdir = os.path.dirname(case.mfile)
+        xavg = pd.read_csv(os.path.join(fdir, "xavg.dat"))
+        rij = pd.read_csv(os.path.join(fdir, "rij_xavg.dat")).drop(columns=["x", "y"])
+        df = xavg.merge(rij, on="z", how="left")
+        tauw = pd.read_csv(os.path.join(fdir, "tw.dat")).tauw.mean()
+        utau = np.sqrt(tauw / case.density)
+        df.insert(0, "case", case.name)
+        df.insert(1, "nu", case.viscosity)
+        df.insert(2, "utau", utau)
+        df.insert(3, "retau", utau * 0.5 * Lz / case.viscosity)
+        df.insert(4, "z+", (df.z - Oz) * utau / case.viscosity)
+        df.insert(5, "u+", df.u / utau)
+        tables.append(df)
+    return pd.concat(tables, ignore_index=True)
+
+
+# ========================================================================
+#
+# Main
+#
+# ========================================================================
+if __name__ == "__main__":
+
+    # Parse arguments
+    parser = argparse.ArgumentParser(
+        description="Run the channel extraction for a campaign of cases and collect them"
+    )
+    parser.add_argument(
+        "manifest",
+        help="CSV manifest of the cases (name, mfile, viscosity, ...)",
+        type=str,
+    )
+    parser.add_argument(
+        "-n",
+        "--ranks",
+        help="Number of ranks in the local MPI pool",
+        default=1,
+        type=int,
+    )
+    parser.add_argument(
+        "--nodes_per_rank",
+        help="Nodes per rank for cases without a rank count in the manifest",
+        default=200000,
+        type=int,
+    )
+    parser.add_argument(
+        "--launcher",
+        help="MPI launcher, {ranks} is replaced by the rank count",
+        default="mpirun -np {ranks}",
+        type=str,
+    )
+    parser.add_argument(
+        "--extra",
+        help="Options passed to the extraction of every case",
+        default="",
+        type=str,
+    )
+    parser.add_argument(
+        "--force", help="Rerun cases whose outputs are up to date", action="store_true"
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="Consolidated statistics of all cases",
+        default="campaign.dat",
+        type=str,
+    )
+    args = parser.parse_args()
+
+    cases = read_manifest(args.manifest)
+
+    # Extraction of the cases that need it
+    jobs = []
+    for case in cases.itertuples(index=False):
+        if not args.force and up_to_date(case.mfile):
+            print(f"Skipping {case.name}: outputs are up to date")
+            continue
+        ranks = case_ranks(case, args.ranks, args.nodes_per_rank)
+        log = os.path.join(os.path.dirname(case.mfile), "pp_campaign.log")
+        cmd = extraction_command(case, ranks, args.launcher, args.extra)
+        jobs.append((case.name, ranks, cmd, log))
+    codes = run_pool(jobs, args.ranks)
+    failed = [name for name, code in codes.items() if code != 0]
+    if failed:
+        print(f"Failed cases (see pp_campaign.log next to their mesh): {failed}")
+
+    # Consolidated store and wall units of all the cases with outputs
+    done = cases[[up_to_date(m) for m in cases.mfile]]
+    if len(done) == 0:
+        sys.exit("No case has up to date outputs")
+    stats = consolidate(done)
+    stats.to_csv(args.output, index=False)
+    print(f"Wrote {len(done)} cases to {args.output}")
+
+    cmd = [sys.executable, os.path.join(scriptpath, "pp_channel_wallunits.py")]
+    fdirs = [os.path.dirname(m) for m in done.mfile]
+    cmd += ["-p"] + [os.path.join(f, "profiles.dat") for f in fdirs]
+    cmd += ["-t"] + [os.path.join(f, "tw.dat") for f in fdirs]
+    cmd += ["--viscosity"] + [repr(float(nu)) for nu in done.viscosity]
+    cmd += ["--density"] + [repr(float(rho)) for rho in done.density]
+    cmd += ["--names"] + list(done.name)
+    cmd += ["-o", os.path.splitext(args.output)[0] + "_wallunits.dat"]
+    subprocess.run(cmd, check=True)
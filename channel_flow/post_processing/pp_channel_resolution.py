@@ -0,0 +1,170 @@
+# ========================================================================
+#
+# Imports
+#
+# ========================================================================
+import argparse
+import os
+import sys
+import numpy as np
+import pandas as pd
+from mpi4py import MPI
+import stk
+import extraction
+import probe
+import resolution
+import timesteps
+
+# ========================================================================
+#
+# Define constants
+#
+# ========================================================================
+Lz              = 2.0
+Oz              = 0.0
+
+# ========================================================================
+#
+# Functions
+#
+# ========================================================================
+def p0_printer(par):
+    iproc = par.rank
+
+    def printer(*args, **kwargs):
+        if iproc == 0:
+            print(*args, **kwargs)
+
+    return printer
+
+
+# ========================================================================
+#
+# Main
+#
+# ========================================================================
+if __name__ == "__main__":
+
+    # Parse arguments
+    parser = argparse.ArgumentParser(
+        description="Mesh resolution in wall units per wall-normal station"
+    )
+    parser.add_argument(
+        "-m",
+        "--mfile",
+        help="Root name of files to postprocess",
+        required=True,
+        type=str,
+    )
+    parser.add_argument("--auto_decomp", help="Auto-decomposition", action="store_true")
+    parser.add_argument(
+        "--probe",
+        help="Report the time steps and fields of the mesh and exit before loading bulk data",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-navg", help="Number of times to average", default=10, type=int
+    )
+    parser.add_argument(
+        "--flowthrough", help="Flowthrough time (L/u)", default=0.4, type=float
+    )
+    parser.add_argument(
+        "--factor",
+        help="Factor of flowthrough time between time steps used in average",
+        type=float,
+        default=1.2,
+    )
+    parser.add_argument(
+        "-i",
+        "--interiorname",
+        help="Name of interior block (i.e. fluid-hex)",
+        type=str,
+        default="fluid-hex",
+    )
+    parser.add_argument(
+        "--viscosity", help="Kinematic viscosity", required=True, type=float
+    )
+    parser.add_argument("--density", help="Density", default=1.0, type=float)
+    args = parser.parse_args()
+
+    fdir = os.path.dirname(args.mfile)
+
+    # Fields read by each extraction stage
+    wall_fields = {"tau_wall": 1}
+
+    comm = MPI.COMM_WORLD
+    rank = comm.Get_rank()
+    par = stk.Parallel.initialize()
+    printer = p0_printer(par)
+
+    mesh = stk.StkMesh(par)
+    printer("Reading meta data for mesh: ", args.mfile)
+    mesh.read_mesh_meta_data(
+        args.mfile, auto_decomp=args.auto_decomp, auto_declare_fields=False
+    )
+    fields = extraction.InputFields(mesh)
+    fields.declare(wall_fields)
+    printer("Done reading meta data")
+
+    # Step selection and fields checked from the mesh header (or the
+    # meta data) before any bulk data is read
+    header = probe.probe_mesh(comm, args.mfile, args.auto_decomp)
+    tsteps = np.array(mesh.stkio.time_steps) if header is None else header["times"]
+    errors = probe.report(
+        printer,
+        tsteps,
+        args.navg,
+        args.flowthrough * args.factor,
+        header,
+        stages=(wall_fields,),
+    )
+    if args.probe or errors:
+        sys.exit(1 if errors else 0)
+
+    printer("Loading bulk data for mesh: ", args.mfile)
+    mesh.populate_bulk_data()
+    printer("Done reading bulk data")
+
+    tsteps = np.array(mesh.stkio.time_steps)
+    tavg, tavg_instantaneous = timesteps.select_steps(
+        tsteps, args.navg, args.flowthrough * args.factor
+    )
+    printer("Averaging tau_wall over the following steps:")
+    printer(tavg_instantaneous)
+
+    # Friction velocity from the mean wall shear stress
+    wall_plan = extraction.NodeGatherPlan(
+        mesh, mesh.meta.get_part("wall_bottom") & mesh.meta.locally_owned_part
+    )
+    tw_sum = 0.0
+    fields.activate(wall_fields)
+    for tstep in tavg_instantaneous:
+        ftime, missing = mesh.stkio.read_defined_input_fields(tstep)
+        printer(f"Loading tau_wall fields for time: {ftime}")
+        tw_sum += wall_plan.gather(wall_fields).sum()
+    tw_sum = comm.allreduce(tw_sum, op=MPI.SUM)
+    nwall = comm.allreduce(wall_plan.nnodes, op=MPI.SUM)
+    utau = np.sqrt(tw_sum / (nwall * len(tavg_instantaneous)) / args.density)
+    h = 0.5 * Lz
+    printer(f"u_tau = {utau}, Re_tau = {utau * h / args.viscosity}")
+
+    # Cell sizes from the coordinate lines of the mesh, each rank only
+    # contributes the lines of its own nodes
+    plan = extraction.NodeGatherPlan(
+        mesh, mesh.meta.get_part(args.interiorname) & mesh.meta.locally_owned_part
+    )
+    lines = resolution.lattice_lines(comm, plan.coords)
+    res = resolution.station_resolution(lines, utau, args.viscosity, Oz, Lz)
+
+    if rank == 0:
+        df = pd.DataFrame(res)
+        df.to_csv(os.path.join(fdir, "resolution.dat"), index=False)
+        lower = df[df.z <= Oz + h]
+        print(f"Cells: {len(lines[0]) - 1} x {len(lines[1]) - 1} x {len(lines[2]) - 1}")
+        print(f"First cell: dz+ = {df['dz+'].iloc[0]:.3f}")
+        print(f"Centerline: dz+ = {lower['dz+'].iloc[-1]:.2f}")
+        print(f"dx+ = {df['dx+_mean'].iloc[0]:.2f}, dy+ = {df['dy+_mean'].iloc[0]:.2f}")
+        print(f"Max wall-normal growth ratio: {np.nanmax(df.dz_ratio):.3f}")
+        print(
+            f"IDDES Delta+ from {df['Delta+_min'].min():.2f} to {df['Delta+_max'].max():.2f}"
+        )
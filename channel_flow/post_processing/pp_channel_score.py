@@ -0,0 +1,76 @@
+# ========================================================================
+#
+# Imports
+#
+# ========================================================================
+import argparse
+import os
+import pandas as pd
+import scoring
+
+# ========================================================================
+#
+# Define constants
+#
+# ========================================================================
+scriptpath      = os.path.abspath(os.path.dirname(__file__))
+datapath        = os.path.abspath(os.path.join(scriptpath, "..", "data"))
+
+# ========================================================================
+#
+# Main
+#
+# ========================================================================
+if __name__ == "__main__":
+
+    # Parse arguments
+    parser = argparse.ArgumentParser(
+        description="Score channel runs against the DNS reference profiles"
+    )
+    parser.add_argument(
+        "-s",
+        "--stats",
+        help="Consolidated statistics (campaign.dat from pp_channel_campaign.py)",
+        nargs="+",
+        required=True,
+        type=str,
+    )
+    parser.add_argument(
+        "--ref_dir",
+        help="Directory with the ReTau_* reference data",
+        default=datapath,
+        type=str,
+    )
+    parser.add_argument(
+        "--cache",
+        help="npz cache of the reference profiles (default: no cache)",
+        type=str,
+    )
+    parser.add_argument(
+        "--yplus_min", help="Lower bound of the log layer in y+", default=30.0, type=float
+    )
+    parser.add_argument(
+        "--outer_max", help="Upper bound of the log layer in y/h", default=0.2, type=float
+    )
+    parser.add_argument(
+        "-o", "--output", help="Scoreboard", default="scoreboard.dat", type=str
+    )
+    args = parser.parse_args()
+
+    store = scoring.ReferenceStore(args.ref_dir, cache=args.cache)
+    stats = pd.concat([pd.read_csv(fname) for fname in args.stats], ignore_index=True)
+
+    # All runs and quantities scored at once
+    names, retau, yplus, values, lengths = scoring.model_profiles(stats)
+    match, errors = scoring.score(
+        store,
+        retau,
+        yplus,
+        values,
+        lengths,
+        yplus_min=args.yplus_min,
+        outer_max=args.outer_max,
+    )
+    board = scoring.scoreboard(names, retau, store, match, errors)
+    board.to_csv(args.output, index=False)
+    print(board[["case", "retau", "ref_retau", "score"]].to_string(index=False))
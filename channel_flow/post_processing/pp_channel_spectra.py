@@ -0,0 +1,237 @@
+# ========================================================================
+#
+# Imports
+#
+# ========================================================================
+import argparse
+import os
+import sys
+import numpy as np
+from mpi4py import MPI
+import stk
+import extraction
+import probe
+import spectra
+import timesteps
+
+# ========================================================================
+#
+# Define constants
+#
+# ========================================================================
+Lx              = 8.0
+Ly              = 3.0
+Lz              = 2.0
+Oz              = 0.0
+dns_yplus       = [5, 10, 19, 30, 40, 59, 79, 98, 178]
+dns_names       = ["u", "w", "v", "p"]  # DNS names of the u, v, w, p columns
+dns_auto        = [("u", "u"), ("v", "v"), ("w", "w"), ("p", "p")]
+dns_cross       = [("u", "v"), ("u", "p"), ("v", "p")]
+
+# ========================================================================
+#
+# Functions
+#
+# ========================================================================
+def p0_printer(par):
+    iproc = par.rank
+
+    def printer(*args, **kwargs):
+        if iproc == 0:
+            print(*args, **kwargs)
+
+    return printer
+
+
+# ========================================================================
+#
+# Main
+#
+# ========================================================================
+if __name__ == "__main__":
+
+    # Parse arguments
+    parser = argparse.ArgumentParser(
+        description="Spectra and two-point correlations on wall-parallel planes"
+    )
+    parser.add_argument(
+        "-m",
+        "--mfile",
+        help="Root name of files to postprocess",
+        required=True,
+        type=str,
+    )
+    parser.add_argument("--auto_decomp", help="Auto-decomposition", action="store_true")
+    parser.add_argument(
+        "--probe",
+        help="Report the time steps and fields of the mesh and exit before loading bulk data",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-v",
+        "--vel_name",
+        help="Name of the velocity field",
+        default="velocity",
+        type=str,
+    )
+    parser.add_argument(
+        "-navg", help="Number of times to average", default=10, type=int
+    )
+    parser.add_argument(
+        "--flowthrough", help="Flowthrough time (L/u)", default=0.4, type=float
+    )
+    parser.add_argument(
+        "--factor",
+        help="Factor of flowthrough time between time steps used in average",
+        type=float,
+        default=1.2,
+    )
+    parser.add_argument(
+        "-i",
+        "--interiorname",
+        help="Name of interior block (i.e. fluid-hex)",
+        type=str,
+        default="fluid-hex",
+    )
+    parser.add_argument(
+        "--yplus",
+        help="Wall distances of the planes in wall units",
+        nargs="+",
+        type=float,
+        default=dns_yplus,
+    )
+    parser.add_argument(
+        "--viscosity", help="Kinematic viscosity", required=True, type=float
+    )
+    parser.add_argument("--density", help="Density", default=1.0, type=float)
+    args = parser.parse_args()
+
+    fdir = os.path.dirname(args.mfile)
+    sdir = os.path.join(fdir, "spectra")
+    cdir = os.path.join(fdir, "correlations")
+
+    # Fields read by each extraction stage
+    wall_fields = {"tau_wall": 1}
+    plane_fields = {args.vel_name: 3, "pressure": 1}
+
+    comm = MPI.COMM_WORLD
+    rank = comm.Get_rank()
+    par = stk.Parallel.initialize()
+    printer = p0_printer(par)
+
+    mesh = stk.StkMesh(par)
+    printer("Reading meta data for mesh: ", args.mfile)
+    mesh.read_mesh_meta_data(
+        args.mfile, auto_decomp=args.auto_decomp, auto_declare_fields=False
+    )
+    fields = extraction.InputFields(mesh)
+    fields.declare(wall_fields, plane_fields)
+    printer("Done reading meta data")
+
+    # Step selection and fields checked from the mesh header (or the
+    # meta data) before any bulk data is read
+    header = probe.probe_mesh(comm, args.mfile, args.auto_decomp)
+    tsteps = np.array(mesh.stkio.time_steps) if header is None else header["times"]
+    errors = probe.report(
+        printer,
+        tsteps,
+        args.navg,
+        args.flowthrough * args.factor,
+        header,
+        stages=(wall_fields, plane_fields),
+    )
+    if args.probe or errors:
+        sys.exit(1 if errors else 0)
+
+    printer("Loading bulk data for mesh: ", args.mfile)
+    mesh.populate_bulk_data()
+    printer("Done reading bulk data")
+
+    tsteps = np.array(mesh.stkio.time_steps)
+    tavg, tavg_instantaneous = timesteps.select_steps(
+        tsteps, args.navg, args.flowthrough * args.factor
+    )
+
+    # Friction velocity from the mean wall shear stress
+    wall_plan = extraction.NodeGatherPlan(
+        mesh, mesh.meta.get_part("wall_bottom") & mesh.meta.locally_owned_part
+    )
+    tw_sum = 0.0
+    fields.activate(wall_fields)
+    for tstep in tavg_instantaneous:
+        ftime, missing = mesh.stkio.read_defined_input_fields(tstep)
+        printer(f"Loading tau_wall fields for time: {ftime}")
+        tw_sum += wall_plan.gather(wall_fields).sum()
+    tw_sum = comm.allreduce(tw_sum, op=MPI.SUM)
+    nwall = comm.allreduce(wall_plan.nnodes, op=MPI.SUM)
+    utau = np.sqrt(tw_sum / (nwall * len(tavg_instantaneous)) / args.density)
+    h = 0.5 * Lz
+    retau = utau * h / args.viscosity
+    printer(f"u_tau = {utau}, Re_tau = {retau}")
+
+    # Spectra and correlations on the wall-parallel planes
+    yplus = np.asarray(args.yplus)
+    plan = extraction.NodeGatherPlan(
+        mesh, mesh.meta.get_part(args.interiorname) & mesh.meta.locally_owned_part
+    )
+    sampler = spectra.PlaneSampler(
+        comm, plan.coords, Oz + yplus * args.viscosity / utau, [Lx, Ly]
+    )
+    pairs = dns_auto + dns_cross
+    acc = spectra.SpectraAccumulator(
+        [Lx, Ly], pairs=[(dns_names.index(a), dns_names.index(b)) for a, b in pairs]
+    )
+    fields.activate(plane_fields)
+    for tstep in tavg:
+        ftime, missing = mesh.stkio.read_defined_input_fields(tstep)
+        printer(f"Loading {args.vel_name} and pressure fields for time: {ftime}")
+        acc.push(sampler.sample(plan.gather(plane_fields)))
+
+    # Each rank writes the planes it owns, in wall units and with the
+    # DNS component names
+    if rank == 0:
+        os.makedirs(sdir, exist_ok=True)
+        os.makedirs(cdir, exist_ok=True)
+    comm.Barrier()
+    scales = {"u": utau, "v": utau, "w": utau, "p": args.density * utau ** 2}
+    scale = np.array([scales[a] * scales[b] for a, b in pairs])
+    nauto = len(dns_auto)
+    auto_names = ["E_" + a + b for a, b in dns_auto]
+    for axis, (dname, desc) in enumerate(
+        [("x", "Streamwise (x)"), ("z", "Spanwise (z)")]
+    ):
+        n = acc.npts[axis]
+        k, spec = acc.spectrum(axis)
+        r, corr = acc.correlation(axis)
+        for i, p in enumerate(sampler.planes):
+            info = [
+                f"Normalization: U_tau, h. Mesh: {args.mfile}",
+                "",
+                f"n{dname} = {n},  Re = {retau:.2f},  "
+                f"y = {(sampler.heights[p] - Oz) / h:.5f},  y+ = {yplus[p]:6.2f}",
+            ]
+            spectra.write_dns_layout(
+                os.path.join(sdir, f"{dname}spec.{yplus[p]:g}"),
+                np.column_stack((k * h, spec[i, :, :nauto] / scale[:nauto])),
+                ["k_" + dname] + auto_names,
+                [f"IDDES {desc} one-dimensional spectra of velocity and pressure"]
+                + info,
+            )
+
+            # Separations in outer and wall units
+            sep = np.column_stack((r / h, r * utau / args.viscosity))
+            rcorr = corr[i] / scale
+            spectra.write_dns_layout(
+                os.path.join(cdir, f"{dname}corr.{yplus[p]:g}"),
+                np.hstack((sep, rcorr[:, :nauto]))[: n // 2 + 1],
+                ["d" + dname, "d" + dname + "+"] + ["R_" + a + b for a, b in dns_auto],
+                [f"IDDES {desc} two-point correlation of velocity and pressure"]
+                + info,
+            )
+            spectra.write_dns_layout(
+                os.path.join(cdir, f"{dname}ccorr.{yplus[p]:g}"),
+                np.hstack((sep, rcorr[:, nauto:])),
+                ["d" + dname, "d" + dname + "+"] + ["R_" + a + b for a, b in dns_cross],
+                [f"IDDES {desc} two-point cross correlations of velocity and pressure"]
+                + info,
+            )
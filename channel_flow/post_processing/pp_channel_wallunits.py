@@ -0,0 +1,156 @@
+# ========================================================================
+#
+# Imports
+#
+# ========================================================================
+import argparse
+import os
+import numpy as np
+import pandas as pd
+import wallunits
+
+# ========================================================================
+#
+# Define constants
+#
+# ========================================================================
+scriptpath      = os.path.abspath(os.path.dirname(__file__))
+datapath        = os.path.abspath(os.path.join(scriptpath, "..", "data"))
+Lz              = 2.0
+Oz              = 0.0
+retau_tol       = 0.25  # relative Re_tau mismatch with the reference that is flagged
+
+# ========================================================================
+#
+# Main
+#
+# ========================================================================
+if __name__ == "__main__":
+
+    # Parse arguments
+    parser = argparse.ArgumentParser(
+        description="Wall units and log-law fits for a sweep of channel results"
+    )
+    parser.add_argument(
+        "-p",
+        "--profiles",
+        help="profiles.dat files, one per case",
+        nargs="+",
+        required=True,
+        type=str,
+    )
+    parser.add_argument(
+        "-t",
+        "--tw",
+        help="tw.dat files, in the same order as the profiles",
+        nargs="+",
+        required=True,
+        type=str,
+    )
+    parser.add_argument(
+        "--viscosity",
+        help="Kinematic viscosity of each case (or one for all cases)",
+        nargs="+",
+        required=True,
+        type=float,
+    )
+    parser.add_argument(
+        "--density",
+        help="Density of each case (or one for all cases)",
+        nargs="+",
+        default=[1.0],
+        type=float,
+    )
+    parser.add_argument(
+        "--names", help="Case names (default: result directories)", nargs="+", type=str
+    )
+    parser.add_argument(
+        "--yplus_min", help="Lower bound of the log-law band in y+", default=30.0, type=float
+    )
+    parser.add_argument(
+        "--outer_max", help="Upper bound of the log-law band in y/h", default=0.2, type=float
+    )
+    parser.add_argument(
+        "--lm_dir",
+        help="Directory with the ReTau_*/LM_Channel_*_mean_prof.dat files",
+        default=datapath,
+        type=str,
+    )
+    parser.add_argument(
+        "-o", "--output", help="Summary table", default="wallunits.dat", type=str
+    )
+    args = parser.parse_args()
+
+    ncases = len(args.profiles)
+    if len(args.tw) != ncases:
+        parser.error("Need one tw.dat per profiles.dat")
+    nu = np.broadcast_to(np.asarray(args.viscosity), (ncases,)).copy()
+    density = np.broadcast_to(np.asarray(args.density), (ncases,)).copy()
+    names = args.names or [os.path.dirname(os.path.abspath(p)) for p in args.profiles]
+    h = 0.5 * Lz
+
+    # Load all cases into padded arrays
+    cases = [
+        wallunits.read_case(pfile, twfile, h, Oz)
+        for pfile, twfile in zip(args.profiles, args.tw)
+    ]
+    z, lengths = wallunits.stack_rows([c[0] for c in cases])
+    u, _ = wallunits.stack_rows([c[1] for c in cases])
+    tauw = np.array([c[2] for c in cases])
+    mask = wallunits.valid_mask(lengths, z.shape[1])
+
+    # Wall units and log-law fit over the band for all cases at once
+    utau, yplus, uplus = wallunits.wall_units(z, u, tauw, nu, density)
+    retau = utau * h / nu
+    band = mask & (yplus >= args.yplus_min) & (z <= args.outer_max * h)
+    kappa, B, nfit = wallunits.log_law_fit(yplus, uplus, band)
+
+    # Closest Lee & Moser reference (in log Re_tau) for each case, and all
+    # the cases interpolated onto their reference grids in one call
+    refs = wallunits.read_lm_profiles(args.lm_dir)
+    ref_re = np.array([ref[0] for ref in refs])
+    match = np.abs(np.log(ref_re)[np.newaxis, :] - np.log(retau)[:, np.newaxis]).argmin(
+        axis=1
+    )
+    far = np.abs(np.log(ref_re[match] / retau)) > np.log(1.0 + retau_tol)
+    for i in np.flatnonzero(far):
+        print(
+            f"Warning: {names[i]} (Re_tau = {retau[i]:.1f}) is compared to the "
+            f"Re_tau = {ref_re[match[i]]:.1f} reference"
+        )
+    ref_yp, ref_lengths = wallunits.stack_rows([refs[m][1] for m in match])
+    ref_up, _ = wallunits.stack_rows([refs[m][2] for m in match])
+    uplus_ref_grid = wallunits.batched_interp(ref_yp, yplus, uplus, lengths)
+    ref_mask = wallunits.valid_mask(ref_lengths, ref_yp.shape[1]) & np.isfinite(
+        uplus_ref_grid
+    )
+    du = np.where(ref_mask, uplus_ref_grid - ref_up, 0.0)
+    ncmp = np.maximum(ref_mask.sum(axis=1), 1)
+
+    summary = pd.DataFrame(
+        {
+            "case": names,
+            "nu": nu,
+            "tauw": tauw,
+            "utau": utau,
+            "retau": retau,
+            "kappa": kappa,
+            "B": B,
+            "nfit": nfit,
+            "lm_retau": ref_re[match],
+            "du+_rms": np.sqrt((du ** 2).sum(axis=1) / ncmp),
+            "du+_max": np.abs(du).max(axis=1),
+        }
+    )
+    summary.to_csv(args.output, index=False)
+    print(summary.to_string(index=False))
+
+    rows = np.nonzero(ref_mask)
+    pd.DataFrame(
+        {
+            "case": np.asarray(names)[rows[0]],
+            "y+": ref_yp[rows],
+            "u+": uplus_ref_grid[rows],
+            "u+_lm": ref_up[rows],
+        }
+    ).to_csv(os.path.splitext(args.output)[0] + "_profiles.dat", index=False)
@@ -10,6 +10,15 @@ import scipy.spatial.qhull as qhull
 import pandas as pd
 from mpi4py import MPI
 import stk
+import accumulators
+import anisotropy
+import checkpoint
+import extraction
+import iddes
+import memory
+import probe
+import reduction
+import timesteps
 from scipy.interpolate import griddata
 import sys
 
@@ -26,6 +35,8 @@ Lz              = 2.0
 Ox              = 0.0
 Oy              = 0.0
 Oz              = 0.0
+rij_first       = [("u", "u"), ("v", "v"), ("w", "w"), ("u", "v"), ("u", "w"), ("v", "w")]
+pdf_width       = 6.0  # histogram half-width in standard deviations of the first step
 
 # ========================================================================
 #
@@ -42,6 +53,35 @@ def p0_printer(par):
     return printer
 
 
+# ========================================================================
+def stage_bytes(nvar, npairs, itemsize, nfields, nmoment):
+    """Rough memory per node of the statistics stages, in bytes
+
+    Returns the memory held for the whole run (mesh fields, coordinates
+    and accumulators), the memory per node of one gathered node range
+    (gather buffers and update temporaries) and the memory of the
+    output stage, which takes over from the node ranges after the time
+    loop. nfields is the number of field components declared on the
+    mesh and nmoment the number of variables with higher moments.
+    """
+    held = 8 * (3 + nfields) + 8 * 3 + 8 * nvar + itemsize * npairs
+    ranged = 8 * (3 * nvar + 2 * npairs)
+    if nmoment > 0:
+        held += 8 * (1 + 2 * nmoment)
+        ranged += 8 * 5 * nmoment
+    # Output array, covariance copy, weights and the slab selection
+    # (each node falls in about 4/3 slabs)
+    output = 8 * (4 + nvar + npairs) + itemsize * npairs + 8 * 5 * 4 // 3
+    return held, ranged, output
+
+
+# ========================================================================
+def projected_peak(nnodes, budget, held, ranged, output):
+    """Projected peak memory and node range size for nnodes nodes"""
+    chunk = memory.chunk_nodes(budget, held * nnodes, ranged, nnodes)
+    return held * nnodes + max(ranged * chunk, output * nnodes), chunk
+
+
 # ========================================================================
 def interp_weights(xyz, uvw):
     """Find the interpolation weights
@@ -80,6 +120,11 @@ if __name__ == "__main__":
         type=str,
     )
     parser.add_argument("--auto_decomp", help="Auto-decomposition", action="store_true")
+    parser.add_argument(
+        "--probe",
+        help="Report the time steps and fields of the mesh and exit before loading bulk data",
+        action="store_true",
+    )
     parser.add_argument(
         "-v",
         "--vel_name",
@@ -112,10 +157,63 @@ if __name__ == "__main__":
         type=float,
         default=0.1,
     )
+    parser.add_argument(
+        "--distributed",
+        help="Reduce per-bin sums across ranks instead of gathering nodes to rank 0",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        help="Resume from and update the averaging checkpoint next to profiles.dat "
+        "(the checkpointed steps stay in the average, only later steps are added)",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--higher_moments",
+        help="Skewness, flatness and PDFs of velocity and pressure per wall-normal station",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--pdf_bins", help="Number of histogram bins", type=int, default=201
+    )
+    parser.add_argument(
+        "--iddes_diagnostics",
+        help="Resolved/modeled stress partition and RANS/LES interface (needs --viscosity)",
+        action="store_true",
+    )
+    parser.add_argument("--viscosity", help="Kinematic viscosity", type=float)
+    parser.add_argument(
+        "--density",
+        help="Density, to get the friction velocity from tau_wall",
+        default=1.0,
+        type=float,
+    )
+    parser.add_argument(
+        "--anisotropy",
+        help="Anisotropy tensor, Lumley invariants and barycentric map per station",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--max_mem_per_rank",
+        help="Memory budget per rank in GiB (float32 second moments, node ranges sized to fit)",
+        type=float,
+    )
+    parser.add_argument(
+        "--weighted",
+        help="Weight the spatial averages by lumped nodal volumes and wall face areas",
+        action="store_true",
+    )
     args = parser.parse_args()
+    if args.iddes_diagnostics and args.viscosity is None:
+        parser.error("--iddes_diagnostics needs --viscosity")
 
     fdir = os.path.dirname(args.mfile)
 
+    # Fields read by each extraction stage, pressure only for the higher moments
+    wall_fields = {"tau_wall": 1}
+    interior_fields = {args.vel_name: 3, "turbulent_viscosity": 1, "turbulent_ke": 1}
+    moment_fields = {args.vel_name: 3, "pressure": 1} if args.higher_moments else {}
+
     comm = MPI.COMM_WORLD
     size = comm.Get_size()
     rank = comm.Get_rank()
@@ -124,192 +222,296 @@ if __name__ == "__main__":
 
     mesh = stk.StkMesh(par)
     printer("Reading meta data for mesh: ", args.mfile)
-    mesh.read_mesh_meta_data(args.mfile, auto_decomp=args.auto_decomp)
+    mesh.read_mesh_meta_data(
+        args.mfile, auto_decomp=args.auto_decomp, auto_declare_fields=False
+    )
+    fields = extraction.InputFields(mesh)
+    fields.declare(wall_fields, interior_fields, moment_fields)
     printer("Done reading meta data")
 
+    # Memory budget: second moments in float32 and the nodes processed
+    # in ranges that fit in the budget
+    budget, stat_dtype = None, np.float64
+    if args.max_mem_per_rank is not None:
+        budget, stat_dtype = args.max_mem_per_rank * memory.gib, np.float32
+    nvar = sum(interior_fields.values())
+    held, ranged, output = stage_bytes(
+        nvar,
+        nvar * (nvar + 1) // 2,
+        np.dtype(stat_dtype).itemsize,
+        sum({**wall_fields, **interior_fields, **moment_fields}.values()),
+        sum(moment_fields.values()),
+    )
+    est = memory.local_nodes(comm, args.mfile, args.auto_decomp)
+    est = comm.allreduce(-1 if est is None else est, op=MPI.MAX)
+    if est >= 0:
+        peak, chunk = projected_peak(est, budget, held, ranged, output)
+        printer(
+            f"Projected peak memory per rank: {peak / memory.gib:.2f} GiB "
+            f"({est} nodes, {chunk} nodes per range)"
+        )
+        if budget is not None and peak > budget:
+            printer("Warning: the memory budget cannot be met on this number of ranks")
+    else:
+        per_node = held + max(ranged, output)
+        printer(
+            f"Projected memory per rank: {per_node * 1e6 / memory.gib:.2f} GiB per "
+            "million nodes (the mesh header is not readable)"
+        )
+
+    # Step selection and fields checked from the mesh header (or the
+    # meta data) before any bulk data is read
+    header = probe.probe_mesh(comm, args.mfile, args.auto_decomp)
+    tsteps = np.array(mesh.stkio.time_steps) if header is None else header["times"]
+    errors = probe.report(
+        printer,
+        tsteps,
+        args.navg,
+        args.flowthrough * args.factor,
+        header,
+        stages=(wall_fields, interior_fields, moment_fields),
+    )
+    if args.probe or errors:
+        sys.exit(1 if errors else 0)
+
     printer("Loading bulk data for mesh: ", args.mfile)
     mesh.populate_bulk_data()
     printer("Done reading bulk data")
 
-    num_time_steps = mesh.stkio.num_time_steps
-    max_time = mesh.stkio.max_time
+    # Figure out the times over which to average
     tsteps = np.array(mesh.stkio.time_steps)
-    printer(f"""Num. time steps = {num_time_steps}\nMax. time step  = {max_time}""")
+    tavg, tavg_instantaneous = timesteps.select_steps(
+        tsteps, args.navg, args.flowthrough * args.factor
+    )
 
-    # Figure out the times over which to average
-    tmp_tavg = np.sort(
-        tsteps[-1] - args.flowthrough * args.factor * np.arange(args.navg)
+    # Nodes on the wall and in the interior
+    twnames = ["x", "y", "z", "tauw"]
+    wall_plan = extraction.NodeGatherPlan(
+        mesh, mesh.meta.get_part("wall_bottom") & mesh.meta.locally_owned_part
+    )
+    names = ["x", "y", "z", "u", "v", "w", "nut", "k"]
+    plan = extraction.NodeGatherPlan(
+        mesh, mesh.meta.get_part(args.interiorname) & mesh.meta.locally_owned_part
     )
-    dist = np.abs(np.array(tsteps)[:, np.newaxis] - tmp_tavg)
-    idx = dist.argmin(axis=0)
-    tavg = tsteps[idx]
-    tavg_instantaneous = tsteps[idx[0] :]
-    printer("Averaging the following steps:")
-    printer(tavg)
+
+    # Resume from the averaging checkpoint
+    tw_sum = np.zeros((wall_plan.nnodes, 1))
+    tw_times = np.zeros(0)
+    acc = accumulators.MomentAccumulator(
+        names[3:],
+        pairs=accumulators.ordered_pairs(names[3:], first=rij_first),
+        dtype=stat_dtype,
+    )
+    acc_times = np.zeros(0)
+    parts = {}
+    if args.checkpoint:
+        ckpt = checkpoint.Checkpoint(
+            comm, os.path.join(fdir, "stats_checkpoint"), [wall_plan.coords, plan.coords]
+        )
+        if ckpt.exists():
+            parts = ckpt.load()
+            tw_sum, tw_times = parts["wall"]["sum"], parts["wall"]["times"]
+            acc = accumulators.MomentAccumulator.from_state(
+                parts["stats"], dtype=stat_dtype
+            )
+            acc_times = parts["stats"]["times"]
+    wall_steps = timesteps.new_steps(tavg_instantaneous, tw_times)
+    stat_steps = timesteps.new_steps(tavg, acc_times)
+    if len(acc_times) > 0:
+        printer(f"Resuming from checkpoint with {len(acc_times)} averaged steps")
+        if tavg[0] > np.max(acc_times):
+            printer(
+                f"Warning: the averaging window starts at {tavg[0]:g}, after the "
+                f"last checkpointed step {np.max(acc_times):g}, the average keeps "
+                "the checkpointed steps"
+            )
+        printer("Adding the following steps:")
+        printer(stat_steps)
 
     # Extract time and spanwise average tau_wall on wall
-    tw_data = None
-    for tstep in tavg_instantaneous:
+    fields.activate(wall_fields)
+    for tstep in wall_steps:
         ftime, missing = mesh.stkio.read_defined_input_fields(tstep)
         printer(f"Loading tau_wall fields for time: {ftime}")
-
-        coords = mesh.meta.coordinate_field
-        wall = mesh.meta.get_part("wall_bottom")
-        sel = wall & mesh.meta.locally_owned_part
-        tauw = mesh.meta.get_field("tau_wall")
-        names = ["x", "y", "z", "tauw"]
-        nnodes = sum(bkt.size for bkt in mesh.iter_buckets(sel, stk.StkRank.NODE_RANK))
-
-        cnt = 0
-        data = np.zeros((nnodes, len(names)))
-        for bkt in mesh.iter_buckets(sel, stk.StkRank.NODE_RANK):
-            xyz = coords.bkt_view(bkt)
-            tw = tauw.bkt_view(bkt)
-            data[cnt : cnt + bkt.size, :] = np.hstack((xyz, tw.reshape(-1, 1)))
-            cnt += bkt.size
-
-        if tw_data is None:
-            tw_data = np.zeros(data.shape)
-        tw_data += data / len(tavg_instantaneous)
-
-    lst = comm.gather(tw_data, root=0)
+        tw_sum += wall_plan.gather(wall_fields)
+    tw_times = np.concatenate((tw_times, wall_steps))
+
+    # Higher moments and histograms per wall-normal station. The bins
+    # are set from the first step (or the checkpoint). They are computed
+    # on rank 0 and broadcast so that all ranks bin with the same edges.
+    fields.activate(interior_fields)
+    moments = None
+    if args.higher_moments:
+        fields.activate(moment_fields)
+        stations = reduction.DistributedAverage(comm, plan.coords, [2])
+        bins = None
+        if "moments" in parts:
+            moments = accumulators.StationMoments.from_state(
+                stations.labels, parts["moments"]
+            )
+            bins = (moments.shift, moments.lo, moments.hi)
+        elif "stats" in parts:
+            printer("Checkpoint has no higher moments, skipping them")
+        elif len(stat_steps) > 0:
+            mesh.stkio.read_defined_input_fields(stat_steps[0])
+            sample = plan.gather(moment_fields)
+            mean = stations.mean(sample, root=0)
+            square = stations.mean(sample ** 2, root=0)
+            if rank == 0:
+                std = np.sqrt(np.maximum(square - mean ** 2, 0.0))
+                bins = (mean, mean - pdf_width * std, mean + pdf_width * std)
+            bins = comm.bcast(bins, root=0)
+        if moments is None and bins is not None:
+            moments = accumulators.StationMoments(stations.labels, *bins, args.pdf_bins)
+
+    # Extract (average) velocity data and Reynolds stresses in one pass,
+    # one node range at a time
+    peak, chunk = projected_peak(plan.nnodes, budget, held, ranged, output)
+    chunks = plan.chunks(chunk)
+    peak = comm.allreduce(peak, op=MPI.MAX)
+    printer(f"Peak memory per rank: {peak / memory.gib:.2f} GiB, {len(chunks)} node ranges")
+    for tstep in stat_steps:
+        ftime, missing = mesh.stkio.read_defined_input_fields(tstep)
+        printer(f"Loading fields for time: {ftime}")
+        acc.push_chunks(
+            plan.nnodes,
+            ((rows, plan.gather(interior_fields, bkts)) for rows, bkts in chunks),
+        )
+        if moments is not None:
+            for rows, bkts in chunks:
+                moments.push(plan.gather(moment_fields, bkts), rows)
+
+    acc_times = np.concatenate((acc_times, stat_steps))
+
+    if args.checkpoint:
+        ckpt.save(
+            wall={"sum": tw_sum, "times": tw_times},
+            stats=dict(acc.state(), times=acc_times),
+            moments=moments.state() if moments is not None else {},
+        )
+
+    # Lumped nodal volumes and wall face areas, computed once for all
+    # the averages below
+    wall_wts, vol_wts = None, None
+    if args.weighted:
+        wall_wts = reduction.dual_volumes(comm, wall_plan.coords[:, :2])
+        vol_wts = reduction.dual_volumes(comm, plan.coords)
+
+    tw_data = np.hstack((wall_plan.coords, tw_sum / len(tw_times)))
+    wall_mean = reduction.homogeneous_mean(
+        comm, tw_data, [0], distributed=args.distributed, weights=wall_wts
+    )
     comm.Barrier()
     if rank == 0:
-        df = pd.DataFrame(np.vstack(lst), columns=names)
-        tw = df.groupby("x", as_index=False).mean().sort_values(by=["x"])
+        tw = pd.DataFrame(wall_mean, columns=twnames)
         twname = os.path.join(fdir, "tw.dat")
         tw.to_csv(twname, index=False)
 
+    # IDDES stress partition and RANS/LES interface
+    if args.iddes_diagnostics:
+        cols = [acc.names.index(name) for name in ("u", "nut", "k")]
+        pidx = [acc.pairs.index(pair) for pair in iddes.partition_pairs]
+        diag, yplus_i = iddes.channel_diagnostics(
+            comm,
+            plan.coords,
+            np.hstack((acc.mean[:, cols], acc.covariance()[:, pidx])),
+            args.viscosity,
+            wall_mean[:, 3].mean() if rank == 0 else None,
+            Oz,
+            0.5 * Lz,
+            rho=args.density,
+            weights=vol_wts,
+        )
+        if rank == 0:
+            pd.DataFrame(diag).to_csv(os.path.join(fdir, "iddes.dat"), index=False)
+            print(f"RANS/LES interface at y+ = {yplus_i}")
 
-    # Extract (average) velocity data
-    vel_data = None
-    rij_data = None
-
-    for tstep in tavg:
-        ftime, missing = mesh.stkio.read_defined_input_fields(tstep)
-        printer(f"Loading fields for time: {ftime}")
-
-        interior = mesh.meta.get_part(args.interiorname)
-        sel = interior & mesh.meta.locally_owned_part
-        velocity = mesh.meta.get_field(args.vel_name)
-        turbvisc = mesh.meta.get_field("turbulent_viscosity")
-        turbke = mesh.meta.get_field("turbulent_ke")
-        names = ["x", "y", "z", "u", "v", "w", "nut","k"]
-        nnodes = sum(bkt.size for bkt in mesh.iter_buckets(sel, stk.StkRank.NODE_RANK))
-
-        cnt = 0
-        data = np.zeros((nnodes, len(names)))
-        for bkt in mesh.iter_buckets(sel, stk.StkRank.NODE_RANK):
-            xyz = coords.bkt_view(bkt)
-            vel = velocity.bkt_view(bkt)
-            tv = turbvisc.bkt_view(bkt)
-            tke = turbke.bkt_view(bkt)
-            data[cnt : cnt + bkt.size, :] = np.hstack((xyz, vel, tv.reshape(-1, 1), tke.reshape(-1, 1)))
-            cnt += bkt.size
-
-        if vel_data is None:
-            vel_data = np.zeros(data.shape)
-        vel_data += data / len(tavg)
-    
-    # Second loop for fluctuating vels
-    for tstep in tavg:
-        ftime, missing = mesh.stkio.read_defined_input_fields(tstep)
-        printer(f"Loading fields for time: {ftime}")
+    # Coordinates, means and Reynolds stresses in a single array
+    stats = np.hstack((plan.coords, acc.mean, acc.covariance()))
+    rijnames = ["x", "y", "z"] + acc.pair_names
 
-        interior = mesh.meta.get_part(args.interiorname)
-        sel = interior & mesh.meta.locally_owned_part
-        velocity = mesh.meta.get_field(args.vel_name)
-        rijnames = ["x", "y", "z","uu","vv","ww","uv"]
-        nnodes = sum(bkt.size for bkt in mesh.iter_buckets(sel, stk.StkRank.NODE_RANK))
-
-        cnt = 0
-        rijdata = np.zeros((nnodes, len(rijnames)))
-        for bkt in mesh.iter_buckets(sel, stk.StkRank.NODE_RANK):
-            xyz = coords.bkt_view(bkt)
-            vel = velocity.bkt_view(bkt)
-            rijdata[cnt : cnt + bkt.size, :] = np.hstack((xyz, vel, 0*vel[:,0].reshape(-1, 1)))
-            cnt += bkt.size
-
-        if rij_data is None:
-            rij_data = np.zeros(rijdata.shape)
-        rij_data[:,0] = rijdata[:,0] 
-        rij_data[:,1] = rijdata[:,1] 
-        rij_data[:,2] = rijdata[:,2] 
-        rij_data[:,3] += ((rijdata[:,3] - vel_data[:,3])**2) / len(tavg)
-        rij_data[:,4] += ((rijdata[:,4] - vel_data[:,4])**2) / len(tavg)
-        rij_data[:,5] += ((rijdata[:,5] - vel_data[:,5])**2) / len(tavg)
-        rij_data[:,6] += (rijdata[:,3] - vel_data[:,3])*(rijdata[:,4] - vel_data[:,4]) / len(tavg)
-
-    # Subset the velocities on planes
-    #dx = 0.05 * 4
-    planes = []
-    fplanes = []
+    # Average the slab around every x plane over its thickness and the
+    # spanwise direction, all planes at once
     dx = args.sdx
+    npointsx = int(Lx / dx) + 1
+    xplanes = np.linspace(Ox, Lx, num=npointsx)
+    slab_mean = reduction.slab_means(
+        comm,
+        stats,
+        xplanes,
+        dx / 1.5,
+        distributed=args.distributed,
+        weights=vol_wts,
+    )
 
-    #for x in utilities.xplanes():
-    npointsx = (int(Lx/dx)+1)
-    xavg = pd.DataFrame()
-    fxavg = pd.DataFrame()
-
-    for x in np.linspace(Ox,Lx,num=npointsx):
-        print(" === x=%f ==="%x)
-        # subset the data around the plane of interest
-        sub = vel_data[(x - dx/1.5 <= vel_data[:, 0]) & (vel_data[:, 0] <= x + dx/1.5), :]
-        fsub = rij_data[(x - dx/1.5 <= rij_data[:, 0]) & (rij_data[:, 0] <= x + dx/1.5), :]
-
-        sub[:,0] = np.around(np.ones(np.shape(sub[:,0]))*x,decimals=3) 
-        sub[:,1] = np.around(sub[:,1],decimals=3) 
-        sub[:,2] = np.around(sub[:,2],decimals=6)
-        fsub[:,0] = np.around(np.ones(np.shape(fsub[:,0]))*x,decimals=3)
-        fsub[:,1] = np.around(fsub[:,1],decimals=4)
-        fsub[:,2] = np.around(fsub[:,2],decimals=6)
+    if rank == 0:
+        print("npointsx: " + str(npointsx))
+        slab_mean[:, :, 0] = np.around(xplanes, decimals=3)[:, np.newaxis]
+        nz = slab_mean.shape[1]
+        planes = slab_mean.reshape(npointsx * nz, -1)
+        xavg = slab_mean.mean(axis=0)
+
+        fcols = list(range(3)) + list(range(len(names), slab_mean.shape[2]))
+        df = pd.DataFrame(planes[:, : len(names)], columns=names)
+        fdf = pd.DataFrame(planes[:, fcols], columns=rijnames)
+        xdf = pd.DataFrame(xavg[:, : len(names)], columns=names)
+        fxdf = pd.DataFrame(xavg[:, fcols], columns=rijnames)
+        for avg in (xdf, fxdf):
+            avg.x = np.around(avg.x, decimals=3)
+            avg.z = np.around(avg.z, decimals=6)
+            avg.y = np.around(avg.y, decimals=3)
 
-        lst = comm.gather(sub, root=0)
-        flst = comm.gather(fsub, root=0)
+        df.to_csv(os.path.join(fdir, "profiles.dat"), index=False)
+        xdf.to_csv(os.path.join(fdir, "xavg.dat"), index=False)
+        fdf.to_csv(os.path.join(fdir, "rij_profiles.dat"), index=False)
+        fxdf.to_csv(os.path.join(fdir, "rij_xavg.dat"), index=False)
+
+        # Anisotropy of the averaged stresses on all planes and the
+        # x-average at once
+        if args.anisotropy:
+            sidx = [len(names) + acc.pairs.index(p) for p in anisotropy.stress_pairs]
+            both = np.concatenate((slab_mean, xavg[np.newaxis]), axis=0)
+            amap = anisotropy.anisotropy_map(both[..., sidx])
+            adf = pd.DataFrame({"x": both[..., 0].ravel(), "z": both[..., 2].ravel()})
+            for key, val in amap.items():
+                adf[key] = val.ravel()
+            adf.z = np.around(adf.z, decimals=6)
+            nplane = npointsx * nz
+            adf.iloc[:nplane].to_csv(os.path.join(fdir, "anisotropy.dat"), index=False)
+            adf.iloc[nplane:].drop(columns="x").to_csv(
+                os.path.join(fdir, "anisotropy_xavg.dat"), index=False
+            )
 
+    # Skewness, flatness and PDFs per wall-normal station
+    if moments is not None:
+        mnames = ["u", "v", "w", "p"]
+        power = reduction.sum_to_root(comm, moments.power)
+        hist = reduction.sum_to_root(comm, moments.hist)
+        tails = reduction.sum_to_root(comm, moments.tails)
         comm.Barrier()
         if rank == 0:
-            xi = np.array([x])
-            df = (
-                pd.DataFrame(np.vstack(lst), columns=names)
-                .groupby(["x", "z"], as_index=False)
-                .mean()
-                .sort_values(by=["x", "z"])
-            )
-            fdf = (
-                pd.DataFrame(np.vstack(flst), columns=rijnames)
-                .groupby(["x", "z"], as_index=False)
-                .mean()
-                .sort_values(by=["x", "z"])
+            total = accumulators.StationMoments.from_state(
+                None, dict(moments.state(), power=power, hist=hist, tails=tails)
             )
-            
-            print("npointsx: " + str(npointsx))
-            planes.append(df)
-            if x == Ox:
-                print("First avg")
-                xavg = df.div(npointsx)
-            if x > Ox:
-                print("More avg" + str(xavg.z.max()))
-                xavg += df.div(npointsx)
-            
-            fplanes.append(fdf)
-            if x == Ox:
-                fxavg = fdf.div(npointsx)
-            if x > Ox:
-                fxavg += fdf.div(npointsx)
-            
-    if rank == 0:
-        xavg.x = np.around(xavg.x,decimals=3) 
-        xavg.z = np.around(xavg.z,decimals=6) 
-        xavg.y = np.around(xavg.y,decimals=3)
-        fxavg.x = np.around(fxavg.x,decimals=3) 
-        fxavg.z = np.around(fxavg.z,decimals=6) 
-        fxavg.y = np.around(fxavg.y,decimals=3)
-
-        df = pd.concat(planes)
-        df.to_csv(os.path.join(fdir, "profiles.dat"), index=False)
-        xavg.to_csv(os.path.join(fdir, "xavg.dat"), index=False)
-
-        fdf = pd.concat(fplanes)
-        fdf.to_csv(os.path.join(fdir, "rij_profiles.dat"), index=False)
-        fxavg.to_csv(os.path.join(fdir, "rij_xavg.dat"), index=False)
+            stats = total.moments()
+            mdf = pd.DataFrame({"z": np.around(stations.centers[:, 0], decimals=6)})
+            for key, fmt in [
+                ("mean", "{0}"),
+                ("var", "{0}{0}"),
+                ("skewness", "S_{0}"),
+                ("flatness", "F_{0}"),
+            ]:
+                for j, name in enumerate(mnames):
+                    mdf[fmt.format(name)] = stats[key][:, j]
+            outside = total.outside()
+            for j, name in enumerate(mnames):
+                mdf[f"below_{name}"] = outside[:, j, 0]
+                mdf[f"above_{name}"] = outside[:, j, 1]
+            mdf.to_csv(os.path.join(fdir, "moments.dat"), index=False)
+
+            centers, density = total.pdfs()
+            pdf = pd.DataFrame({"z": np.repeat(mdf.z.values, args.pdf_bins)})
+            for j, name in enumerate(mnames):
+                pdf[name] = centers[:, j, :].ravel()
+                pdf[f"p({name})"] = density[:, j, :].ravel()
+            pdf.to_csv(os.path.join(fdir, "pdfs.dat"), index=False)
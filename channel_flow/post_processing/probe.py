@@ -0,0 +1,132 @@
+# ========================================================================
+#
+# Imports
+#
+# ========================================================================
+import re
+import numpy as np
+from scipy.io import netcdf_file
+import timesteps
+
+
+# ========================================================================
+#
+# Define constants
+#
+# ========================================================================
+# Component suffixes of the vector fields in an Exodus file
+component_suffix = re.compile(r"^(.+)_([xyz])$", re.IGNORECASE)
+
+
+# ========================================================================
+#
+# Function definitions
+#
+# ========================================================================
+def read_header(fname):
+    """Time steps and nodal field names of an Exodus file, None if unknown
+
+    The file is memory-mapped, as in memory.exodus_num_nodes, so only
+    the header and the pages of time_whole and name_nod_var are read.
+    Both are copied out before the file is closed. Vector fields are
+    stored per component (velocity_x, ...) and are returned as one name
+    with its number of components.
+    """
+    try:
+        with netcdf_file(fname, "r", mmap=True) as f:
+            times = np.array(f.variables["time_whole"][:], dtype=np.float64)
+            var = f.variables.get("name_nod_var")
+            raw = [] if var is None else np.array(var[:])
+            del var
+    except (OSError, TypeError, ValueError, KeyError):
+        return None
+    names = [b"".join(row).split(b"\x00")[0].decode().strip() for row in raw]
+    fields = {}
+    for name in names:
+        match = component_suffix.match(name)
+        base = match.group(1) if match else name
+        fields[base] = fields.get(base, 0) + 1
+    return {"times": times, "fields": fields}
+
+
+# ========================================================================
+def probe_mesh(comm, mfile, auto_decomp):
+    """Header of the mesh files as read by rank 0 and sent to all ranks
+
+    With auto_decomp the header of mfile is read, otherwise the one of
+    the first decomposed file (mfile.<nranks>.0), which has the same
+    time axis and fields. Collective.
+    """
+    size = comm.Get_size()
+    fname = mfile if auto_decomp else f"{mfile}.{size}.{0:0{len(str(size))}d}"
+    return comm.bcast(read_header(fname) if comm.Get_rank() == 0 else None, root=0)
+
+
+# ========================================================================
+def check_selection(tsteps, navg, spacing):
+    """Suspicious choices in the steps the averaging would select
+
+    These are likely typos in the number of steps or their spacing but
+    the averaging can still run, e.g. over repeated steps.
+    """
+    problems = []
+    if navg > len(tsteps):
+        problems.append(f"{navg} steps requested but only {len(tsteps)} exist")
+    tavg, _ = timesteps.select_steps(tsteps, navg, spacing)
+    if len(np.unique(tavg)) < len(tavg):
+        dt = np.median(np.diff(tsteps)) if len(tsteps) > 1 else 0.0
+        problems.append(
+            f"step spacing {spacing:g} selects some steps more than once "
+            f"(output interval {dt:g})"
+        )
+    start = tsteps[-1] - spacing * (navg - 1)
+    if start < tsteps[0]:
+        problems.append(
+            f"the averaging window starts at {start:g}, "
+            f"before the first step {tsteps[0]:g}"
+        )
+    return problems
+
+
+# ========================================================================
+def check_fields(header, *stages):
+    """Fields of the extraction stages that are missing from the header"""
+    missing = []
+    for fields in stages:
+        for name, ncomp in fields.items():
+            found = header["fields"].get(name)
+            if found != ncomp and name not in missing:
+                missing.append(name)
+    return missing
+
+
+# ========================================================================
+def report(printer, tsteps, navg, spacing, header=None, stages=()):
+    """Print the step selection and return the errors that stop a run
+
+    tsteps are the time steps of the mesh, from the header or from the
+    meta data. With a header, the fields of the stages are checked too.
+    Suspicious selections are printed as warnings, missing time steps
+    or fields are returned as errors.
+    """
+    printer(f"Num. time steps = {len(tsteps)}")
+    if len(tsteps) == 0:
+        printer("Error: the mesh has no time steps")
+        return ["the mesh has no time steps"]
+    printer(f"Time range      = [{tsteps[0]:g}, {tsteps[-1]:g}]")
+    tavg, tavg_instantaneous = timesteps.select_steps(tsteps, navg, spacing)
+    printer("Averaging the following steps:")
+    printer(tavg)
+    printer(f"Instantaneous averages over {len(tavg_instantaneous)} steps")
+    for warning in check_selection(tsteps, navg, spacing):
+        printer(f"Warning: {warning}")
+
+    errors = []
+    if header is not None:
+        printer("Nodal fields    = " + ", ".join(sorted(header["fields"])))
+        missing = check_fields(header, *stages)
+        if missing:
+            errors.append(f"fields missing from the mesh: {missing}")
+    for error in errors:
+        printer(f"Error: {error}")
+    return errors
@@ -0,0 +1,63 @@
+# ========================================================================
+#
+# Imports
+#
+# ========================================================================
+import numpy as np
+from scipy.interpolate import CubicSpline
+import averaging
+
+
+# ========================================================================
+#
+# Function definitions
+#
+# ========================================================================
+def resample_1d(z, values, zi, method="cubic"):
+    """Resample all columns of values(z) onto zi at once
+
+    values has shape (len(z), nvar) and the abscissae are sorted once
+    and shared by all variables.
+    """
+    order = np.argsort(z)
+    z = np.asarray(z)[order]
+    values = np.asarray(values).reshape(len(z), -1)[order]
+
+    if method == "cubic":
+        return CubicSpline(z, values, axis=0)(zi)
+    elif method == "linear":
+        idx = np.clip(np.searchsorted(z, zi), 1, len(z) - 1)
+        wts = ((zi - z[idx - 1]) / (z[idx] - z[idx - 1]))[:, np.newaxis]
+        return values[idx - 1] * (1.0 - wts) + values[idx] * wts
+    else:
+        raise ValueError(f"Unknown resampling method: {method}")
+
+
+# ========================================================================
+def resample_profile(x0, x, z, values, zi, method="cubic", tol=averaging.default_tol):
+    """Wall-normal profile at x0 from homogeneously averaged (x, z) data
+
+    The points are grouped in x lines. The lines on either side of x0
+    are each resampled onto zi with a 1D kernel, and the two profiles
+    are blended linearly in x. Outside the x lines the profile is NaN,
+    as with griddata, instead of extrapolated.
+    """
+    labels, nlines = averaging.line_labels(x, tol)
+    xlines = np.bincount(labels, weights=x, minlength=nlines) / np.bincount(
+        labels, minlength=nlines
+    )
+    if x0 < xlines[0] - tol or x0 > xlines[-1] + tol:
+        nvar = np.asarray(values).reshape(len(x), -1).shape[1]
+        return np.full((len(zi), nvar), np.nan)
+
+    b = int(np.clip(np.searchsorted(xlines, x0), 0, nlines - 1))
+    a = max(b - 1, 0)
+    if np.abs(xlines[b] - x0) <= tol or a == b:
+        a = b
+
+    prof_a = resample_1d(z[labels == a], values[labels == a], zi, method)
+    if a == b:
+        return prof_a
+    prof_b = resample_1d(z[labels == b], values[labels == b], zi, method)
+    wt = (x0 - xlines[a]) / (xlines[b] - xlines[a])
+    return prof_a * (1.0 - wt) + prof_b * wt
@@ -0,0 +1,259 @@
+# ========================================================================
+#
+# Imports
+#
+# ========================================================================
+import numpy as np
+import pandas as pd
+from mpi4py import MPI
+import averaging
+
+
+# ========================================================================
+#
+# Function definitions
+#
+# ========================================================================
+def global_labels(comm, keys):
+    """Dense labels for integer keys, consistent across all ranks
+
+    Only the unique keys of each rank are exchanged. Returns the labels
+    of the local keys and the sorted global unique keys.
+    """
+    codes, uniq = pd.factorize(np.asarray(keys, dtype=np.int64))
+    allkeys = np.unique(
+        np.concatenate([np.asarray(u, dtype=np.int64) for u in comm.allgather(uniq)])
+    )
+    return np.searchsorted(allkeys, uniq)[codes], allkeys
+
+
+# ========================================================================
+def global_line_labels(comm, values, tol=averaging.default_tol):
+    """Coordinate line labels that are consistent across all ranks"""
+    values = np.asarray(values)
+    vmin = comm.allreduce(values.min() if len(values) > 0 else np.inf, op=MPI.MIN)
+    labels, allkeys = global_labels(comm, averaging.quantize(values, vmin, tol))
+    if len(allkeys) == 0:
+        return labels, 0
+    ids = averaging.run_ids(allkeys)
+    return ids[labels], int(ids[-1]) + 1
+
+
+# ========================================================================
+def global_line_positions(comm, values, labels, nlines):
+    """Mean coordinate of each global coordinate line"""
+    local = np.vstack(
+        (
+            np.bincount(labels, weights=values, minlength=nlines),
+            np.bincount(labels, minlength=nlines),
+        )
+    )
+    tot = np.zeros_like(local)
+    comm.Allreduce(local, tot, op=MPI.SUM)
+    return tot[0] / np.maximum(tot[1], 1.0)
+
+
+# ========================================================================
+def periodic_line_labels(comm, values, length, tol=averaging.default_tol):
+    """Line labels along a periodic direction of the given length
+
+    If the mesh holds both periodic images (e.g. x = 0 and x = Lx), the
+    last line is dropped and its nodes are labeled -1.
+    """
+    labels, n = global_line_labels(comm, values, tol)
+    pos = global_line_positions(comm, values, labels, n)
+    if n > 1 and pos[-1] - pos[0] > length - 0.5 * (pos[1] - pos[0]):
+        labels = np.where(labels == n - 1, -1, labels)
+        n -= 1
+    return labels, n
+
+
+# ========================================================================
+def dual_widths(comm, values, length=None, tol=averaging.default_tol):
+    """Width of the dual cell of each node along one lattice direction
+
+    The dual cell of a coordinate line extends half way to its
+    neighbouring lines, so the end lines get half of their interval
+    (nodes on both images of a periodic direction then share one full
+    cell). With length the direction is closed (e.g. around a cylinder)
+    and the end lines wrap around. A single line gets unit width.
+    """
+    values = np.asarray(values)
+    labels, n = global_line_labels(comm, values, tol)
+    pos = global_line_positions(comm, values, labels, n)
+    if n < 2:
+        return np.ones(len(values))
+    if length is None:
+        edges = np.concatenate(([pos[0]], 0.5 * (pos[1:] + pos[:-1]), [pos[-1]]))
+        widths = np.diff(edges)
+    else:
+        gaps = np.diff(np.append(pos, pos[0] + length))
+        widths = 0.5 * (gaps + np.roll(gaps, 1))
+    return widths[labels]
+
+
+# ========================================================================
+def dual_volumes(comm, coords, lengths=None, tol=averaging.default_tol):
+    """Lumped nodal volumes (or face areas) of a distributed lattice
+
+    The columns of coords are the lattice directions (three for a
+    volume, two for a wall face) and lengths the period of each closed
+    direction (None otherwise). Each rectilinear cell gives an equal
+    share of its volume to its corners, which sums to the product of
+    the dual widths. Collective, and meant to be computed once per
+    point set and reused for every average.
+    """
+    coords = np.asarray(coords)
+    lengths = lengths or [None] * coords.shape[1]
+    vol = np.ones(coords.shape[0])
+    for d, length in enumerate(lengths):
+        vol *= dual_widths(comm, coords[:, d], length, tol)
+    return vol
+
+
+# ========================================================================
+def sum_to_root(comm, local, root=0):
+    """Sum an array over all ranks, returns None except on root"""
+    local = np.ascontiguousarray(local, dtype=np.float64)
+    out = np.zeros_like(local) if comm.Get_rank() == root else None
+    comm.Reduce(local, out, op=MPI.SUM, root=root)
+    return out
+
+
+# ========================================================================
+def homogeneous_mean(comm, data, keep, distributed=False, root=0, weights=None):
+    """Per-bin means of nodal data on root, None on the other ranks
+
+    The first three columns of data are the node coordinates. By default
+    the rows are gathered to root and averaged there. With distributed,
+    each rank bins its own rows and only the per-bin partial sums are
+    reduced. weights (one per row) turn the means into weighted means.
+    """
+    if distributed:
+        return DistributedAverage(comm, data[:, :3], keep, weights=weights).mean(
+            data, root=root
+        )
+
+    if weights is not None:
+        data = np.column_stack((data, weights))
+    lst = comm.gather(data, root=root)
+    if comm.Get_rank() != root:
+        return None
+    data = np.vstack(lst)
+    if weights is not None:
+        data, weights = data[:, :-1], data[:, -1]
+    return averaging.HomogeneousAverage(data[:, :3], keep, weights=weights).mean(data)
+
+
+# ========================================================================
+def slab_means(
+    comm, data, centers, half_width, distributed=False, root=0, weights=None
+):
+    """Means of nodal data per x slab and z line on root, None elsewhere
+
+    The first three columns of data are the node coordinates. Every
+    slab is averaged over its thickness and the spanwise direction in
+    one pass and with a single collective. The result has shape
+    (len(centers), nz, ncols). By default the rows are gathered to
+    root, with distributed only the per-bin partial sums are reduced.
+    weights (one per row) turn the means into weighted means.
+    """
+    if distributed:
+        lines, nlines = global_line_labels(comm, data[:, 2])
+        local = np.ascontiguousarray(
+            averaging.slab_sums(data, lines, nlines, centers, half_width, weights)
+        )
+        res = np.zeros_like(local) if comm.Get_rank() == root else None
+        comm.Reduce(local, res, op=MPI.SUM, root=root)
+    else:
+        if weights is not None:
+            data = np.column_stack((data, weights))
+        lst = comm.gather(data, root=root)
+        if comm.Get_rank() != root:
+            return None
+        data = np.vstack(lst)
+        if weights is not None:
+            data, weights = data[:, :-1], data[:, -1]
+        lines, nlines = averaging.line_labels(data[:, 2])
+        res = averaging.slab_sums(data, lines, nlines, centers, half_width, weights)
+
+    if res is None:
+        return None
+    counts = res[..., -1:]
+    return res[..., :-1] / np.where(counts > 0, counts, 1.0)
+
+
+# ========================================================================
+#
+# Classes
+#
+# ========================================================================
+class DistributedAverage:
+    """Homogeneous average of nodal data distributed across ranks
+
+    Each rank bins its own nodes into bins that are defined
+    consistently on all ranks. Per-bin partial sums and counts are then
+    combined with Allreduce (or Reduce to a root rank), so only the
+    output bins cross the network instead of every node. Bins are
+    sorted by the kept coordinates, as in averaging.HomogeneousAverage.
+    With weights the means are weighted and counts holds the total
+    weight of each bin. The constructor and all reductions are
+    collective.
+    """
+
+    def __init__(self, comm, coords, keep, tol=averaging.default_tol, weights=None):
+        self.comm = comm
+        coords = np.asarray(coords)
+        self.npts = coords.shape[0]
+        self.keep = list(keep)
+        self.weights = None if weights is None else np.asarray(weights, dtype=np.float64)
+
+        axes = [global_line_labels(comm, coords[:, d], tol) for d in self.keep]
+        if self.keep:
+            kept_shape = [max(n, 1) for _, n in axes]
+            combined = np.ravel_multi_index([lbl for lbl, _ in axes], kept_shape)
+            self.labels, allkeys = global_labels(comm, combined)
+            self.nbins = len(allkeys)
+        else:
+            self.labels, self.nbins = np.zeros(self.npts, dtype=np.int64), 1
+
+        self.counts = self._reduce(
+            np.bincount(self.labels, weights=self.weights, minlength=self.nbins).astype(
+                np.float64
+            ),
+            None,
+        )
+        self.centers = self.mean(coords[:, self.keep])
+
+    def _reduce(self, local, root):
+        local = np.ascontiguousarray(local)
+        out = np.zeros_like(local)
+        if root is None:
+            self.comm.Allreduce(local, out, op=MPI.SUM)
+            return out
+        self.comm.Reduce(local, out, op=MPI.SUM, root=root)
+        return out if self.comm.Get_rank() == root else None
+
+    def local_sums(self, values):
+        """Per-bin sums of the values owned by this rank"""
+        values = np.asarray(values, dtype=np.float64)
+        flat = values.reshape(self.npts, int(np.prod(values.shape[1:])))
+        if self.weights is not None:
+            flat = flat * self.weights[:, np.newaxis]
+        res = np.zeros((self.nbins, flat.shape[1]))
+        for j in range(flat.shape[1]):
+            res[:, j] = np.bincount(self.labels, weights=flat[:, j], minlength=self.nbins)
+        return res.reshape((self.nbins,) + values.shape[1:])
+
+    def sums(self, values, root=None):
+        """Global per-bin sums, on all ranks or only on root"""
+        return self._reduce(self.local_sums(values), root)
+
+    def mean(self, values, root=None):
+        """Global per-bin means, on all ranks or only on root"""
+        sums = self.sums(values, root)
+        if sums is None:
+            return None
+        counts = np.where(self.counts > 0, self.counts, 1.0)
+        return sums / counts.reshape((-1,) + (1,) * (sums.ndim - 1))
+
@@ -0,0 +1,65 @@
+# ========================================================================
+#
+# Imports
+#
+# ========================================================================
+import numpy as np
+import averaging
+import iddes
+import reduction
+
+
+# ========================================================================
+#
+# Function definitions
+#
+# ========================================================================
+def lattice_lines(comm, coords, tol=averaging.default_tol):
+    """Sorted coordinate line positions of a distributed lattice
+
+    Returns one array of line positions per direction. Only the line
+    keys and per-line sums cross the network, so neither the nodes nor
+    the connectivity are gathered on one rank. Collective.
+    """
+    lines = []
+    for d in range(coords.shape[1]):
+        labels, n = reduction.global_line_labels(comm, coords[:, d], tol)
+        lines.append(reduction.global_line_positions(comm, coords[:, d], labels, n))
+    return lines
+
+
+# ========================================================================
+def station_resolution(lines, utau, nu, origin, height):
+    """Cell sizes in wall units per wall-normal station
+
+    lines holds the x, y and z line positions of a tensor-product
+    channel mesh. The hexes lie between consecutive lines, so their
+    edge lengths are the line spacings and a station is one layer of
+    cells in z. For each station, the function returns:
+    - the wall distance of the cell centers, measured from the nearer
+      wall;
+    - the wall-normal size and its growth ratio;
+    - the extremes and mean of the streamwise and spanwise sizes;
+    - the extremes of the IDDES length scale.
+    All lengths are in wall units, except z.
+    """
+    dx, dy, dz = (np.diff(pos) for pos in lines)
+    zc = 0.5 * (lines[2][1:] + lines[2][:-1])
+    dw = np.minimum(zc - origin, origin + height - zc)
+    scale = utau / nu
+    nst = len(dz)
+
+    out = {"z": zc, "z+": dw * scale, "dz+": dz * scale}
+    out["dz_ratio"] = np.append(dz[1:] / dz[:-1], np.nan)
+    for name, h in (("dx+", dx), ("dy+", dy)):
+        out[name + "_min"] = np.full(nst, h.min() * scale)
+        out[name + "_mean"] = np.full(nst, h.mean() * scale)
+        out[name + "_max"] = np.full(nst, h.max() * scale)
+
+    # The IDDES length scale grows with the largest edge of a cell, so
+    # its extremes over a layer come from the extremes of that edge
+    hmin = np.maximum(max(dx.min(), dy.min()), dz)
+    hmax = np.maximum(max(dx.max(), dy.max()), dz)
+    out["Delta+_min"] = iddes.length_scale(hmin, dz, dw) * scale
+    out["Delta+_max"] = iddes.length_scale(hmax, dz, dw) * scale
+    return out
@@ -0,0 +1,223 @@
+# ========================================================================
+#
+# Imports
+#
+# ========================================================================
+import glob
+import os
+import numpy as np
+import pandas as pd
+import wallunits
+
+
+# ========================================================================
+#
+# Define constants
+#
+# ========================================================================
+# Scored quantities, in wall units and DNS naming (v wall-normal)
+quantities = ["U+", "uu+", "vv+", "ww+", "uv+", "k+"]
+
+# Model columns (w wall-normal) of each quantity and the power of u_tau
+# that makes it dimensionless
+model_columns = {
+    "U+": (["u"], 1),
+    "uu+": (["uu"], 2),
+    "vv+": (["ww"], 2),
+    "ww+": (["vv"], 2),
+    "uv+": (["uw"], 2),
+    "k+": (["uu", "vv", "ww"], 2),
+}
+
+
+# ========================================================================
+#
+# Function definitions
+#
+# ========================================================================
+def reference_files(rdir):
+    """Source files of the reference profiles in one ReTau_* directory
+
+    The Lee & Moser mean and fluctuation profiles are used when present,
+    the processed chan*_means.txt and chan*_rey.txt files otherwise.
+    """
+    lm = sorted(glob.glob(os.path.join(rdir, "LM_Channel_*_mean_prof.dat")))
+    lm += sorted(glob.glob(os.path.join(rdir, "LM_Channel_*_vel_fluc_prof.dat")))
+    if len(lm) == 2:
+        return lm
+    processed = sorted(glob.glob(os.path.join(rdir, "processed", "chan*_means.txt")))
+    processed += sorted(glob.glob(os.path.join(rdir, "processed", "chan*_rey.txt")))
+    return processed if len(processed) == 2 else []
+
+
+# ========================================================================
+def read_reference(files):
+    """Re_tau, y+ and the scored quantities of one reference case"""
+    if files[0].endswith(".dat"):
+        mean = np.loadtxt(files[0], comments="%")
+        fluc = np.loadtxt(files[1], comments="%")
+        yplus, U = mean[:, 1], mean[:, 2]
+        uu, vv, ww, uv, k = (fluc[:, c] for c in (2, 3, 4, 5, 8))
+    else:
+        mean = pd.read_csv(files[0], sep=r"\s+")
+        rey = pd.read_csv(files[1], sep=r"\s+")
+        yplus, U = mean["y+"].values, mean.Umean.values
+        cols = ("R_uu", "R_vv", "R_ww", "R_uv", "k")
+        uu, vv, ww, uv, k = (rey[c].values for c in cols)
+        mean = mean.values
+    retau = yplus[-1] / mean[-1, 0]
+    return retau, yplus, np.vstack((U, uu, vv, ww, uv, k))
+
+
+# ========================================================================
+def stack_profiles(profiles):
+    """Stack (nq, n) profiles of different lengths into (nrows, nq, nmax)"""
+    return np.stack(
+        [wallunits.stack_rows(list(rows))[0] for rows in zip(*profiles)], axis=1
+    )
+
+
+# ========================================================================
+def model_profiles(stats):
+    """Lower half profiles of the runs in a consolidated statistics table
+
+    stats has one row per (case, station) with the columns case, nu,
+    utau, z+ and the model means and stresses (see model_columns), as
+    written by pp_channel_campaign.py. Returns the case names, Re_tau,
+    the padded y+ rows, the quantities with shape (nrun, nq, n) and the
+    row lengths.
+    """
+    names, retau, yplus, values = [], [], [], []
+    for name, df in stats.groupby("case", sort=False):
+        df = df[df["z+"] <= df.retau.iloc[0] * (1.0 + 1e-8)].sort_values("z+")
+        utau = df.utau.values
+        names.append(name)
+        retau.append(df.retau.iloc[0])
+        yplus.append(df["z+"].values)
+        cols = []
+        for q in quantities:
+            model, power = model_columns[q]
+            val = df[model].values.sum(axis=1) / utau ** power
+            cols.append(0.5 * val if q == "k+" else val)
+        values.append(np.vstack(cols))
+    yp, lengths = wallunits.stack_rows(yplus)
+    return names, np.array(retau), yp, stack_profiles(values), lengths
+
+
+# ========================================================================
+def relative(num, den):
+    """num / den, NaN where den is zero (no points compared)"""
+    return np.where(den > 0, num / np.where(den > 0, den, 1.0), np.nan)
+
+
+# ========================================================================
+def score(store, retau, yplus, values, lengths, yplus_min=30.0, outer_max=0.2):
+    """Errors of all runs and quantities against their closest reference
+
+    The model profiles of every (run, quantity) pair are interpolated
+    onto the y+ points of the matched reference in one batched call.
+    Errors are relative to the reference over the points covered by the
+    run: l2 = |model - ref|_2 / |ref|_2, linf = max|model - ref| /
+    max|ref| and log is l2 restricted to the log layer (y+ >= yplus_min
+    and y/delta <= outer_max). Returns the matched reference indices and
+    a dictionary of (nrun, nq) error arrays.
+    """
+    nrun, nq, n = values.shape
+    match = store.match(retau)
+    ref_yp = np.repeat(store.yplus[match], nq, axis=0)
+    ref_len = np.repeat(store.lengths[match], nq)
+    ref = store.values[match].reshape(nrun * nq, -1)
+
+    model = wallunits.batched_interp(
+        ref_yp,
+        np.repeat(yplus, nq, axis=0),
+        values.reshape(nrun * nq, n),
+        np.repeat(lengths, nq),
+    )
+    mask = wallunits.valid_mask(ref_len, ref_yp.shape[1]) & np.isfinite(model)
+    diff = np.where(mask, model - ref, 0.0)
+    refm = np.where(mask, ref, 0.0)
+    band = mask & (ref_yp >= yplus_min)
+    band &= ref_yp <= outer_max * np.repeat(store.retau[match], nq)[:, np.newaxis]
+
+    errors = {
+        "l2": relative(
+            np.sqrt((diff ** 2).sum(axis=1)), np.sqrt((refm ** 2).sum(axis=1))
+        ),
+        "linf": relative(np.abs(diff).max(axis=1), np.abs(refm).max(axis=1)),
+        "log": relative(
+            np.sqrt((np.where(band, diff, 0.0) ** 2).sum(axis=1)),
+            np.sqrt((np.where(band, refm, 0.0) ** 2).sum(axis=1)),
+        ),
+    }
+    return match, {key: val.reshape(nrun, nq) for key, val in errors.items()}
+
+
+# ========================================================================
+def scoreboard(names, retau, store, match, errors):
+    """Table of the errors of every run, best mean l2 error first"""
+    board = pd.DataFrame(
+        {"case": names, "retau": retau, "ref_retau": store.retau[match]}
+    )
+    for key, err in errors.items():
+        for j, q in enumerate(quantities):
+            board[f"{q}_{key}"] = err[:, j]
+    board["score"] = np.nanmean(errors["l2"], axis=1)
+    return board.sort_values("score", ignore_index=True)
+
+
+# ========================================================================
+#
+# Classes
+#
+# ========================================================================
+class ReferenceStore:
+    """DNS reference profiles of all Re_tau as padded arrays
+
+    All ReTau_* directories under ddir are parsed once and kept as
+    arrays (retau, yplus with shape (nref, n), values with shape
+    (nref, nq, n), lengths). With cache, the arrays are saved to an npz
+    file and reloaded as long as it is newer than every source file.
+    """
+
+    def __init__(self, ddir, cache=None):
+        rdirs = sorted(glob.glob(os.path.join(ddir, "ReTau_*")))
+        sources = [reference_files(rdir) for rdir in rdirs]
+        sources = [files for files in sources if files]
+        flat = [f for files in sources for f in files]
+        if cache is not None and self._fresh(cache, flat):
+            with np.load(cache) as dat:
+                for key in ("retau", "yplus", "values", "lengths"):
+                    setattr(self, key, dat[key])
+            return
+
+        if not sources:
+            raise RuntimeError(f"No reference profiles found under {ddir}")
+        refs = sorted((read_reference(files) for files in sources), key=lambda r: r[0])
+        self.retau = np.array([r[0] for r in refs])
+        self.yplus, self.lengths = wallunits.stack_rows([r[1] for r in refs])
+        self.values = stack_profiles([r[2] for r in refs])
+        if cache is not None:
+            np.savez(
+                cache,
+                sources=np.array(flat),
+                retau=self.retau,
+                yplus=self.yplus,
+                values=self.values,
+                lengths=self.lengths,
+            )
+
+    @staticmethod
+    def _fresh(cache, sources):
+        if not os.path.isfile(cache):
+            return False
+        with np.load(cache) as dat:
+            same = list(dat["sources"]) == sources
+        newest = max(os.path.getmtime(f) for f in sources)
+        return same and os.path.getmtime(cache) >= newest
+
+    def match(self, retau):
+        """Index of the closest reference (in log Re_tau) of each run"""
+        return np.abs(
+            np.log(self.retau)[np.newaxis, :] - np.log(retau)[:, np.newaxis]
+        ).argmin(axis=1)
@@ -0,0 +1,200 @@
+# ========================================================================
+#
+# Imports
+#
+# ========================================================================
+import numpy as np
+import averaging
+import reduction
+
+
+# ========================================================================
+#
+# Function definitions
+#
+# ========================================================================
+def write_dns_layout(fname, data, names, header):
+    """Write columns of data in the layout of the chan180 DNS files"""
+    cols = "".join(f"{name:>13s}" for name in names)
+    np.savetxt(
+        fname,
+        data,
+        fmt="%13.4e",
+        header="\n".join(header + ["", cols, ""]),
+        delimiter="",
+        comments="# ",
+    )
+
+
+# ========================================================================
+#
+# Classes
+#
+# ========================================================================
+class PlaneSampler:
+    """Wall-parallel planes of nodal data, each assembled on one rank
+
+    The nodes must lie on a tensor-product lattice that is uniform and
+    periodic in x and y. A plane at height z0 is interpolated linearly
+    between the two z lines that bracket it. Planes are dealt
+    round-robin to the ranks, and each sample moves only the nodes of
+    the bracketing lines to the plane owners with a single alltoall.
+    The routing is built once, the constructor is collective.
+    """
+
+    def __init__(self, comm, coords, heights, lengths, tol=averaging.default_tol):
+        self.comm = comm
+        size = comm.Get_size()
+        self.heights = np.asarray(heights, dtype=np.float64)
+        nplanes = len(self.heights)
+
+        zlabels, nz = reduction.global_line_labels(comm, coords[:, 2], tol)
+        self.zlines = reduction.global_line_positions(comm, coords[:, 2], zlabels, nz)
+        ix, self.nx = reduction.periodic_line_labels(
+            comm, coords[:, 0], lengths[0], tol
+        )
+        iy, self.ny = reduction.periodic_line_labels(
+            comm, coords[:, 1], lengths[1], tol
+        )
+        self.ncells = self.nx * self.ny
+
+        # Bracketing z lines and interpolation weights
+        upper = np.clip(np.searchsorted(self.zlines, self.heights), 1, nz - 1)
+        wts = np.clip(
+            (self.heights - self.zlines[upper - 1])
+            / (self.zlines[upper] - self.zlines[upper - 1]),
+            0.0,
+            1.0,
+        )
+        self.owner = np.arange(nplanes) % size
+        self.planes = np.flatnonzero(self.owner == comm.Get_rank())
+
+        # Node rows contributing to each plane, grouped by owner
+        inside = (ix >= 0) & (iy >= 0)
+        rows, planes, weights = [], [], []
+        for p in range(nplanes):
+            for line, wt in ((upper[p] - 1, 1.0 - wts[p]), (upper[p], wts[p])):
+                sel = np.flatnonzero(inside & (zlabels == line))
+                rows.append(sel)
+                planes.append(np.full(len(sel), p))
+                weights.append(np.full(len(sel), wt))
+        rows = np.concatenate(rows)
+        planes = np.concatenate(planes)
+        weights = np.concatenate(weights)
+
+        dest = self.owner[planes]
+        order = np.argsort(dest, kind="stable")
+        self.rows = rows[order]
+        self.weights = weights[order][:, np.newaxis]
+        self.splits = np.cumsum(np.bincount(dest, minlength=size))[:-1]
+
+        # Where the owners put each received value
+        targets = (planes // size) * self.ncells + np.ravel_multi_index(
+            (ix[rows], iy[rows]), (self.nx, self.ny)
+        )
+        self.targets = np.concatenate(
+            comm.alltoall(np.split(targets[order], self.splits))
+        ).astype(np.int64)
+
+    def sample(self, values):
+        """Planes owned by this rank, shape (nplanes, nx, ny, nvar)
+
+        values holds the nodal data (one row per node in coords).
+        Collective.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        values = values.reshape(values.shape[0], -1)
+        nvar = values.shape[1]
+        sent = np.split(values[self.rows] * self.weights, self.splits)
+        recv = np.concatenate(self.comm.alltoall(sent)).reshape(-1, nvar)
+
+        size = len(self.planes) * self.ncells
+        out = np.zeros((size, nvar))
+        for j in range(nvar):
+            out[:, j] = np.bincount(self.targets, weights=recv[:, j], minlength=size)
+        return out.reshape(len(self.planes), self.nx, self.ny, nvar)
+
+
+# ========================================================================
+class SpectraAccumulator:
+    """Time-averaged one-dimensional spectra of wall-parallel planes
+
+    Each push takes planes with shape (nplanes, nx, ny, nvar) and
+    transforms all x lines and all y lines at once with batched real
+    FFTs. The cross-spectra of the variable index pairs in pairs
+    (default: the auto-spectrum of every variable) are averaged over
+    lines and time. The fluctuations are about the time and plane mean,
+    which only changes the zero wavenumber, so the raw cross-spectra
+    and the plane means are accumulated and the zero mode is corrected
+    at the end.
+
+    Two-point correlations follow from the same cross-spectra by an
+    inverse FFT (Wiener-Khinchin), so they cost no extra pass.
+    """
+
+    def __init__(self, lengths, pairs=None):
+        self.lengths = list(lengths)
+        self.pairs = None if pairs is None else [tuple(p) for p in pairs]
+        self.count = 0
+        self.npts = None
+        self.cross = [None, None]
+        self.mean_sum = None
+
+    def push(self, planes):
+        if self.count == 0:
+            self.npts = planes.shape[1:3]
+            if self.pairs is None:
+                self.pairs = [(i, i) for i in range(planes.shape[3])]
+            self._ia = np.array([a for a, _ in self.pairs], dtype=int)
+            self._ib = np.array([b for _, b in self.pairs], dtype=int)
+            self.cross = [
+                np.zeros(
+                    (planes.shape[0], planes.shape[1 + axis] // 2 + 1, len(self.pairs)),
+                    dtype=np.complex128,
+                )
+                for axis in (0, 1)
+            ]
+            self.mean_sum = np.zeros((planes.shape[0], planes.shape[3]))
+        self.count += 1
+        for axis in (0, 1):
+            modes = np.fft.rfft(planes, axis=1 + axis)
+            self.cross[axis] += (np.conj(modes[..., self._ia]) * modes[..., self._ib]).mean(
+                axis=2 - axis
+            )
+        self.mean_sum += planes.mean(axis=(1, 2))
+
+    def mean(self):
+        """Time and plane mean, shape (nplanes, nvar)"""
+        return self.mean_sum / max(self.count, 1)
+
+    def _fluctuations(self, axis):
+        """Averaged cross-spectra of the fluctuations"""
+        n = self.npts[axis]
+        cross = self.cross[axis] / max(self.count, 1)
+        mean = self.mean()
+        cross[:, 0, :] -= n ** 2 * mean[:, self._ia] * mean[:, self._ib]
+        return cross
+
+    def spectrum(self, axis):
+        """Wavenumbers and spectra along x (axis=0) or y (axis=1)
+
+        Spectra are one-sided (co-spectra for cross pairs) with shape
+        (nplanes, n/2, npairs) and normalized like the chan180 DNS
+        files: the sum over wavenumbers is the covariance (up to the
+        Nyquist mode).
+        """
+        n = self.npts[axis]
+        spec = 2.0 * self._fluctuations(axis)[:, : n // 2, :].real / n ** 2
+        spec[:, 0, :] *= 0.5
+        k = 2.0 * np.pi * np.arange(n // 2) / self.lengths[axis]
+        return k, spec
+
+    def correlation(self, axis):
+        """Separations and two-point correlations <a(x) b(x + r)>
+
+        Correlations cover the whole period, shape (nplanes, n, npairs).
+        """
+        n = self.npts[axis]
+        corr = np.fft.irfft(self._fluctuations(axis), n=n, axis=1) / n
+        r = self.lengths[axis] * np.arange(n) / n
+        return r, corr
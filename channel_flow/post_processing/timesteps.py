@@ -0,0 +1,33 @@
+# ========================================================================
+#
+# Imports
+#
+# ========================================================================
+import numpy as np
+
+
+# ========================================================================
+#
+# Function definitions
+#
+# ========================================================================
+def select_steps(tsteps, navg, spacing):
+    """Time steps to average over
+
+    Returns the navg steps closest to times spaced by spacing back from
+    the last step (tavg), and every step from the first of those to
+    the end (tavg_instantaneous).
+    """
+    tsteps = np.asarray(tsteps)
+    tmp_tavg = np.sort(tsteps[-1] - spacing * np.arange(navg))
+    dist = np.abs(tsteps[:, np.newaxis] - tmp_tavg)
+    idx = dist.argmin(axis=0)
+    return tsteps[idx], tsteps[idx[0] :]
+
+
+# ========================================================================
+def new_steps(steps, done):
+    """Steps after the last of the steps already averaged"""
+    if len(done) == 0:
+        return steps
+    return steps[steps > np.max(done)]
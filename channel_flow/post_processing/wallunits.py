@@ -0,0 +1,135 @@
+# ========================================================================
+#
+# Imports
+#
+# ========================================================================
+import glob
+import os
+import re
+import numpy as np
+import pandas as pd
+
+
+# ========================================================================
+#
+# Function definitions
+#
+# ========================================================================
+def read_case(pfile, twfile, half_height=1.0, origin=0.0):
+    """Mean velocity profile of the lower half channel and mean tau_wall
+
+    pfile is a profiles.dat written by the channel post-processing
+    (several x planes are averaged together) and twfile the matching
+    tw.dat. Returns the wall distance, the streamwise velocity and the
+    mean wall shear stress.
+    """
+    prof = pd.read_csv(pfile).groupby("z", sort=True).u.mean()
+    z = prof.index.values - origin
+    lower = (z >= 0) & (z <= half_height * (1.0 + 1e-8))
+    tauw = pd.read_csv(twfile).tauw.mean()
+    return z[lower], prof.values[lower], tauw
+
+
+# ========================================================================
+def read_lm_profiles(ddir):
+    """DNS mean profiles found under ddir, sorted by Re_tau
+
+    The Lee & Moser profile of a ReTau_* directory is used when present,
+    the processed chan*_means.txt profile otherwise (Re_tau 180, 395 and
+    590). Returns a list of (Re_tau, y+, U+) tuples.
+    """
+    refs = []
+    for rdir in sorted(glob.glob(os.path.join(ddir, "ReTau_*"))):
+        lm = glob.glob(os.path.join(rdir, "LM_Channel_*_mean_prof.dat"))
+        processed = glob.glob(os.path.join(rdir, "processed", "chan*_means.txt"))
+        if lm:
+            # The last Re_tau in the header is the case parameter (the
+            # first one is in the reference title)
+            with open(lm[0]) as f:
+                retau = re.findall(r"Re_tau\s*=\s*([0-9.]+)", f.read())[-1]
+            dat = np.loadtxt(lm[0], comments="%")
+            refs.append((float(retau), dat[:, 1], dat[:, 2]))
+        elif processed:
+            dat = pd.read_csv(processed[0], sep=r"\s+")
+            yplus = dat["y+"].values
+            refs.append((yplus[-1] / dat.y.values[-1], yplus, dat.Umean.values))
+    return sorted(refs, key=lambda ref: ref[0])
+
+
+# ========================================================================
+def stack_rows(arrays):
+    """Stack 1D arrays of different lengths into a (nrows, nmax) array
+
+    Rows are padded with their last value. Returns the array and the
+    row lengths.
+    """
+    lengths = np.array([len(a) for a in arrays])
+    out = np.empty((len(arrays), lengths.max()))
+    for i, a in enumerate(arrays):
+        out[i, : len(a)] = a
+        out[i, len(a) :] = a[-1]
+    return out, lengths
+
+
+# ========================================================================
+def valid_mask(lengths, ncols):
+    """Mask of the unpadded entries of a stacked array"""
+    return np.arange(ncols) < np.asarray(lengths)[:, np.newaxis]
+
+
+# ========================================================================
+def wall_units(z, u, tauw, nu, density=1.0):
+    """Friction velocity, y+ and u+ of all cases
+
+    z and u have shape (ncases, n), tauw and nu shape (ncases,).
+    """
+    utau = np.sqrt(np.asarray(tauw) / density)
+    scale = (utau / np.asarray(nu))[:, np.newaxis]
+    return utau, z * scale, u / utau[:, np.newaxis]
+
+
+# ========================================================================
+def log_law_fit(yplus, uplus, mask):
+    """Least-squares fit of u+ = ln(y+) / kappa + B on the masked points
+
+    All cases are fitted at once from masked sums. Returns kappa, B and
+    the number of points used for each case (NaN for fewer than 2).
+    """
+    x = np.where(mask, np.log(np.where(mask, yplus, 1.0)), 0.0)
+    y = np.where(mask, uplus, 0.0)
+    n = mask.sum(axis=1)
+    sx, sy = x.sum(axis=1), y.sum(axis=1)
+    sxx, sxy = (x * x).sum(axis=1), (x * y).sum(axis=1)
+    det = n * sxx - sx ** 2
+    ok = (n > 1) & (det > 0)
+    safe = np.where(ok, det, 1.0)
+    slope = np.where(ok, (n * sxy - sx * sy) / safe, np.nan)
+    intercept = np.where(ok, (sxx * sy - sx * sxy) / safe, np.nan)
+    return 1.0 / slope, intercept, n
+
+
+# ========================================================================
+def batched_interp(xq, x, y, lengths):
+    """Linear interpolation of many (x, y) rows in one searchsorted
+
+    x and y have shape (nrows, n) with x increasing along each row (over
+    the first lengths entries), xq has shape (nrows, m). Each row is
+    shifted by a multiple of the overall span so that all rows form a
+    single sorted array. Points outside the range of their row are NaN.
+    """
+    nrows, n = x.shape
+    lo = np.minimum(x.min(axis=1), xq.min(axis=1))
+    hi = np.maximum(x.max(axis=1), xq.max(axis=1))
+    shift = (np.arange(nrows) * (2.0 * (hi - lo).max() + 1.0) - lo)[:, np.newaxis]
+    xs = (x + shift).ravel()
+    qs = xq + shift
+
+    first = np.arange(nrows)[:, np.newaxis] * n
+    last = first + np.asarray(lengths)[:, np.newaxis] - 1
+    idx = np.clip(np.searchsorted(xs, qs.ravel()).reshape(xq.shape), first + 1, last)
+    x0, x1 = xs[idx - 1], xs[idx]
+    y0, y1 = y.ravel()[idx - 1], y.ravel()[idx]
+    wts = (qs - x0) / np.where(x1 > x0, x1 - x0, 1.0)
+    out = y0 + wts * (y1 - y0)
+    outside = (qs < xs[first]) | (qs > xs[last])
+    return np.where(outside, np.nan, out)
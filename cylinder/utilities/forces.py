@@ -0,0 +1,204 @@
+# ========================================================================
+#
+# Imports
+#
+# ========================================================================
+import io
+import json
+import os
+import re
+import time
+import numpy as np
+import pandas as pd
+
+
+# ========================================================================
+#
+# Define constants
+#
+# ========================================================================
+# Bytes before the parsed offset used to detect a rewritten file
+tail_check = 256
+
+# Lines that do not start with a number (e.g. a header repeated on restart)
+text_line = re.compile(rb"^[ \t]*[^-+.0-9 \t\r\n].*$", re.MULTILINE)
+
+
+# ========================================================================
+#
+# Function definitions
+#
+# ========================================================================
+def cache_names(fname):
+    """Binary cache and its description, next to the force file"""
+    root = os.path.join(os.path.dirname(fname), "." + os.path.basename(fname))
+    return root + ".bin", root + ".json"
+
+
+# ========================================================================
+def read_columns(f):
+    """Column names from the header line and the offset of the first row"""
+    f.seek(0)
+    line = f.readline()
+    if not line.endswith(b"\n"):
+        return None, 0
+    return line.decode().split(), len(line)
+
+
+# ========================================================================
+def parse_rows(f, offset, columns):
+    """Rows of complete lines from offset on and the offset after them
+
+    A line still being written (no end of line yet) is left for the
+    next call. Repeats of the header line are skipped, any other text
+    line or a row with the wrong number of values is an error.
+    """
+    f.seek(offset)
+    text = f.read()
+    end = text.rfind(b"\n") + 1
+    if end == 0:
+        return np.zeros((0, len(columns))), offset
+    text = text[:end]
+    for line in text_line.findall(text):
+        if line.decode().split() != columns:
+            raise ValueError(f"Unexpected line in {f.name}: {line.decode().strip()}")
+    text = text_line.sub(b"", text)
+    try:
+        rows = pd.read_csv(
+            io.BytesIO(text),
+            sep=r"\s+",
+            header=None,
+            dtype=np.float64,
+            float_precision="round_trip",
+        ).values
+    except pd.errors.EmptyDataError:
+        return np.zeros((0, len(columns))), offset + end
+    if rows.shape[1] != len(columns) or rows.size != len(text.split()):
+        raise ValueError(f"Rows of {f.name} do not have {len(columns)} columns")
+    return rows, offset + end
+
+
+# ========================================================================
+def load_segment(fname):
+    """Force history of one file as a memory-mapped array and its columns
+
+    The whitespace-separated file is parsed once into a binary cache
+    (hidden files .<fname>.bin and .<fname>.json next to it). Later
+    calls only parse the rows appended since, so reading the history of
+    a running simulation stays cheap. The cache is rebuilt if the file
+    was rewritten (shorter, or changed before the parsed offset).
+    """
+    bname, jname = cache_names(fname)
+    with open(fname, "rb") as f:
+        columns, start = read_columns(f)
+        if columns is None:
+            return np.zeros((0, 0)), []
+        info = None
+        if os.path.isfile(jname) and os.path.isfile(bname):
+            # The description is only valid if the binary cache holds at
+            # least the rows it counts
+            with open(jname, "r") as j:
+                info = json.load(j)
+            size = os.path.getsize(fname)
+            nbytes = info["nrows"] * len(info["columns"]) * 8
+            if (
+                info["columns"] != columns
+                or size < info["offset"]
+                or os.path.getsize(bname) < nbytes
+            ):
+                info = None
+            else:
+                f.seek(max(info["offset"] - tail_check, 0))
+                check = f.read(min(tail_check, info["offset"]))
+                if check.hex() != info["tail"]:
+                    info = None
+        if info is None:
+            info = {"columns": columns, "offset": start, "nrows": 0, "tail": ""}
+            if os.path.isfile(jname):
+                os.remove(jname)
+            open(bname, "wb").close()
+
+        rows, offset = parse_rows(f, info["offset"], columns)
+        if len(rows) > 0:
+            # Rows left by an interrupted update are not counted in nrows,
+            # so they are dropped before appending, and the description is
+            # replaced in one step once the rows are written
+            with open(bname, "r+b") as b:
+                b.truncate(info["nrows"] * len(columns) * 8)
+                b.seek(0, os.SEEK_END)
+                b.write(np.ascontiguousarray(rows, dtype=np.float64).tobytes())
+            f.seek(max(offset - tail_check, 0))
+            info.update(
+                offset=offset,
+                nrows=info["nrows"] + len(rows),
+                tail=f.read(min(tail_check, offset)).hex(),
+            )
+            tmp = f"{jname}.{os.getpid()}.tmp"
+            with open(tmp, "w") as j:
+                json.dump(info, j)
+            os.replace(tmp, jname)
+
+    if info["nrows"] == 0:
+        return np.zeros((0, len(columns))), columns
+    data = np.memmap(
+        bname, dtype=np.float64, mode="r", shape=(info["nrows"], len(columns))
+    )
+    return data, columns
+
+
+# ========================================================================
+def splice(segments):
+    """One history from restarted segments, later segments win overlaps
+
+    A restart repeats the times after the checkpoint it started from, so
+    the rows of a segment at or after the first time of any later
+    segment are dropped, as are repeated times within a segment.
+    Segments are given in restart order, time in the first column.
+    """
+    segments = [s for s in segments if len(s) > 0]
+    if not segments:
+        return np.zeros((0, 0))
+    firsts = np.array([s[0, 0] for s in segments])
+    cutoffs = np.append(np.minimum.accumulate(firsts[::-1])[::-1][1:], np.inf)
+    kept = []
+    for seg, cutoff in zip(segments, cutoffs):
+        t = seg[:, 0]
+        last = np.append(t[1:] != t[:-1], True)
+        kept.append(seg[(t < cutoff) & last])
+    return np.concatenate(kept)
+
+
+# ========================================================================
+def load_history(fnames):
+    """Spliced force history of restart segments as an array"""
+    if isinstance(fnames, str):
+        fnames = [fnames]
+    return splice([load_segment(fname)[0] for fname in fnames])
+
+
+# ========================================================================
+def read_forces(fnames):
+    """Spliced force history of restart segments as a DataFrame"""
+    if isinstance(fnames, str):
+        fnames = [fnames]
+    segments = [load_segment(fname) for fname in fnames]
+    columns = next((c for _, c in segments if c), [])
+    return pd.DataFrame(splice([s for s, _ in segments]), columns=columns)
+
+
+# ========================================================================
+def follow(fnames, poll=10.0):
+    """Yield the spliced history each time the last segment grows
+
+    For dashboards on running simulations. Only the appended rows are
+    parsed at each poll. Stops when interrupted.
+    """
+    if isinstance(fnames, str):
+        fnames = [fnames]
+    last = None
+    while True:
+        size = os.path.getsize(fnames[-1]) if os.path.isfile(fnames[-1]) else -1
+        if size != last:
+            last = size
+            yield read_forces(fnames)
+        time.sleep(poll)
@@ -5,6 +5,7 @@
 # ========================================================================
 import argparse
 import os
+import sys
 import numpy as np
 import scipy.spatial.qhull as qhull
 import pandas as pd
@@ -12,6 +13,17 @@ from mpi4py import MPI
 import stk
 from scipy.interpolate import griddata
 
+# Shared STK extraction helpers live with the channel post-processing
+scriptpath = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(
+    0, os.path.join(scriptpath, "..", "..", "channel_flow", "post_processing")
+)
+import accumulators
+import extraction
+import probe
+import reduction
+import timesteps
+
 
 # ========================================================================
 #
@@ -49,6 +61,72 @@ def interpolate(values, vtx, wts):
     return np.einsum("nj,nj->n", np.take(values, vtx), wts)
 
 
+# ========================================================================
+def angular_bins(comm, coords, center, nbins, span_bins):
+    """Angle and (theta, z) bin of each node on the cylinder surface
+
+    theta is in degrees from the front stagnation point (the -x side of
+    the cylinder for a flow in +x), increasing towards -y, so the two
+    sides of the cylinder fall in different bins. The angular bins
+    start on the wake centreline (theta = 180), so the seam between the
+    first and the last bin is in the wake and not at the stagnation
+    point, see bin_theta. The span is split in span_bins bins of equal
+    width. Collective.
+    """
+    x, y, z = (coords[:, d] - c for d, c in enumerate((*center, 0.0)))
+    phi = np.mod(np.degrees(np.arctan2(y, x)), 360.0)
+    theta = np.mod(phi + 180.0, 360.0)
+    zmin = comm.allreduce(z.min(initial=np.inf), op=MPI.MIN)
+    zmax = comm.allreduce(z.max(initial=-np.inf), op=MPI.MAX)
+    it = (phi * nbins / 360.0).astype(np.int64) % nbins
+    iz = ((z - zmin) * span_bins / max(zmax - zmin, 1e-300)).astype(np.int64)
+    return theta, it * span_bins + np.clip(iz, 0, span_bins - 1), (zmin, zmax)
+
+
+# ========================================================================
+def bin_theta(it, nbins):
+    """theta at the center of the angular bins it of angular_bins"""
+    return np.mod((it + 0.5) * 360.0 / nbins + 180.0, 360.0)
+
+
+# ========================================================================
+def binned_cp(comm, labels, nlabels, mean, var, lo, hi, weights=None):
+    """Per-bin Cp statistics of nodal time statistics on rank 0
+
+    The mean and the variance are averaged over the nodes of each bin
+    (with weights if given) and the RMS is the square root of the
+    averaged variance. The minimum and maximum are the extremes over the
+    nodes. Returns the bin counts (total weights) and the statistics,
+    None on the other ranks.
+    """
+    w = np.ones(len(labels)) if weights is None else weights
+    sums = np.column_stack(
+        [
+            np.bincount(labels, weights=v, minlength=nlabels)
+            for v in (w, w * mean, w * var)
+        ]
+    )
+    sums = reduction.sum_to_root(comm, sums)
+    lmin = np.full(nlabels, np.inf)
+    lmax = np.full(nlabels, -np.inf)
+    np.minimum.at(lmin, labels, lo)
+    np.maximum.at(lmax, labels, hi)
+    gmin = np.empty(nlabels) if comm.Get_rank() == 0 else None
+    gmax = np.empty(nlabels) if comm.Get_rank() == 0 else None
+    comm.Reduce(lmin, gmin, op=MPI.MIN, root=0)
+    comm.Reduce(lmax, gmax, op=MPI.MAX, root=0)
+    if sums is None:
+        return None
+    counts = np.where(sums[:, 0] > 0, sums[:, 0], 1.0)
+    return {
+        "count": sums[:, 0],
+        "cp_mean": sums[:, 1] / counts,
+        "cp_rms": np.sqrt(np.maximum(sums[:, 2] / counts, 0.0)),
+        "cp_min": gmin,
+        "cp_max": gmax,
+    }
+
+
 # ========================================================================
 #
 # Main
@@ -66,6 +144,11 @@ if __name__ == "__main__":
         type=str,
     )
     parser.add_argument("--auto_decomp", help="Auto-decomposition", action="store_true")
+    parser.add_argument(
+        "--probe",
+        help="Report the time steps and fields of the mesh and exit before loading bulk data",
+        action="store_true",
+    )
     parser.add_argument(
         "-v",
         "--vel_name",
@@ -76,10 +159,42 @@ if __name__ == "__main__":
     parser.add_argument(
         "-tavg", help="Time to average over to average", default=10, type=int
     )
+    parser.add_argument(
+        "--distributed",
+        help="Reduce per-bin sums across ranks instead of gathering nodes to rank 0",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--weighted",
+        help="Weight the spanwise average by the lumped wall face areas",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--theta_bins",
+        help="Number of angular bins for Cp(theta)",
+        default=180,
+        type=int,
+    )
+    parser.add_argument(
+        "--span_bins", help="Number of spanwise bins for Cp(theta)", default=1, type=int
+    )
+    parser.add_argument(
+        "--center",
+        help="Cylinder center (x, y)",
+        nargs=2,
+        default=[0.0, 0.0],
+        type=float,
+    )
+    parser.add_argument("--density", help="Density", required=True, type=float)
+    parser.add_argument("--uinf", help="Freestream velocity", required=True, type=float)
+    parser.add_argument("--pinf", help="Freestream pressure", default=0.0, type=float)
     args = parser.parse_args()
 
     fdir = os.path.dirname(args.mfile)
 
+    # Fields read by each extraction stage
+    wall_fields = {"pressure": 1}
+
     comm = MPI.COMM_WORLD
     size = comm.Get_size()
     rank = comm.Get_rank()
@@ -88,60 +203,108 @@ if __name__ == "__main__":
 
     mesh = stk.StkMesh(par)
     printer("Reading meta data for mesh: ", args.mfile)
-    mesh.read_mesh_meta_data(args.mfile, auto_decomp=args.auto_decomp)
+    mesh.read_mesh_meta_data(
+        args.mfile, auto_decomp=args.auto_decomp, auto_declare_fields=False
+    )
+    fields = extraction.InputFields(mesh)
+    fields.declare(wall_fields)
     printer("Done reading meta data")
 
+    # Step selection and fields checked from the mesh header (or the
+    # meta data) before any bulk data is read
+    header = probe.probe_mesh(comm, args.mfile, args.auto_decomp)
+    tsteps = np.array(mesh.stkio.time_steps) if header is None else header["times"]
+    errors = probe.report(
+        printer,
+        tsteps,
+        args.tavg,
+        1.0,
+        header,
+        stages=(wall_fields,),
+    )
+    if args.probe or errors:
+        sys.exit(1 if errors else 0)
+
     printer("Loading bulk data for mesh: ", args.mfile)
     mesh.populate_bulk_data()
     printer("Done reading bulk data")
 
-    num_time_steps = mesh.stkio.num_time_steps
-    max_time = mesh.stkio.max_time
-    tsteps = np.array(mesh.stkio.time_steps)
-    printer(f"""Num. time steps = {num_time_steps}\nMax. time step  = {max_time}""")
-
     # Figure out the times over which to average
-    tmp_tavg = np.sort(
-        tsteps[-1] - np.arange(args.tavg)
-    )
-    dist = np.abs(np.array(tsteps)[:, np.newaxis] - tmp_tavg)
-    idx = dist.argmin(axis=0)
-    tavg = tsteps[idx]
-    tavg_instantaneous = tsteps[idx[0] :]
-    printer("Averaging the following steps:")
-    printer(tavg)
+    tsteps = np.array(mesh.stkio.time_steps)
+    tavg, tavg_instantaneous = timesteps.select_steps(tsteps, args.tavg, 1.0)
 
     # Extract time and spanwise average pressure on wall
-    p_data = None
+    names = ["x", "y", "z", "pressure"]
+    plan = extraction.NodeGatherPlan(
+        mesh, mesh.meta.get_part("cylinder") & mesh.meta.locally_owned_part
+    )
+    acc = accumulators.MomentAccumulator(["pressure"])
+    p_min = np.full((plan.nnodes, 1), np.inf)
+    p_max = np.full((plan.nnodes, 1), -np.inf)
+    fields.activate(wall_fields)
     for tstep in tavg_instantaneous:
         ftime, missing = mesh.stkio.read_defined_input_fields(tstep)
         printer(f"Loading pressure fields for time: {ftime}")
+        p = plan.gather(wall_fields)
+        acc.push(p)
+        np.minimum(p_min, p, out=p_min)
+        np.maximum(p_max, p, out=p_max)
+
+    p_data = np.hstack((plan.coords, acc.mean))
+
+    # Lumped face areas on the (arc length, span) lattice of the cylinder
+    # surface, computed once
+    wall_wts = None
+    if args.weighted:
+        x = plan.coords[:, 0] - args.center[0]
+        y = plan.coords[:, 1] - args.center[1]
+        radius = comm.allreduce(np.hypot(x, y).sum()) / comm.allreduce(plan.nnodes)
+        wall_wts = reduction.dual_volumes(
+            comm,
+            np.column_stack((radius * np.arctan2(y, x), plan.coords[:, 2])),
+            [2.0 * np.pi * radius, None],
+        )
 
-        coords = mesh.meta.coordinate_field
-        wall = mesh.meta.get_part("cylinder")
-        sel = wall & mesh.meta.locally_owned_part
-        press = mesh.meta.get_field("pressure")
-        names = ["x", "y", "z", "pressure"]
-        nnodes = sum(bkt.size for bkt in mesh.iter_buckets(sel, stk.StkRank.NODE_RANK))
-
-        cnt = 0
-        data = np.zeros((nnodes, len(names)))
-        for bkt in mesh.iter_buckets(sel, stk.StkRank.NODE_RANK):
-            xyz = coords.bkt_view(bkt)
-            tw = press.bkt_view(bkt)
-            data[cnt : cnt + bkt.size, :] = np.hstack((xyz, tw.reshape(-1, 1)))
-            cnt += bkt.size
-
-        if p_data is None:
-            p_data = np.zeros(data.shape)
-        p_data += data / len(tavg_instantaneous)
-
-    lst = comm.gather(p_data, root=0)
+    wall_mean = reduction.homogeneous_mean(
+        comm, p_data, [0], distributed=args.distributed, weights=wall_wts
+    )
     comm.Barrier()
     if rank == 0:
         # Save x, y, z, P file
-        df = pd.DataFrame(np.vstack(lst), columns=names)
-        P = df.groupby("x", as_index=False).mean().sort_values(by=["x"])
+        P = pd.DataFrame(wall_mean, columns=names)
         fname = os.path.join(fdir, "cylpressure.dat")
         P.to_csv(fname, index=False)
 
+    # Cp(theta) from the nodal time statistics, binned by angle (and
+    # span), with both sides of the cylinder kept apart
+    q = 0.5 * args.density * args.uinf ** 2
+    theta, labels, (zmin, zmax) = angular_bins(
+        comm, plan.coords, args.center, args.theta_bins, args.span_bins
+    )
+    cp = binned_cp(
+        comm,
+        labels,
+        args.theta_bins * args.span_bins,
+        (acc.mean[:, 0] - args.pinf) / q,
+        acc.covariance()[:, 0] / q ** 2,
+        (p_min[:, 0] - args.pinf) / q,
+        (p_max[:, 0] - args.pinf) / q,
+        weights=wall_wts,
+    )
+    if rank == 0:
+        it, iz = np.divmod(np.arange(args.theta_bins * args.span_bins), args.span_bins)
+        dz = (zmax - zmin) / args.span_bins
+        table = pd.DataFrame(
+            {
+                "theta": bin_theta(it, args.theta_bins),
+                "z": zmin + (iz + 0.5) * dz,
+                **cp,
+            }
+        )
+        table = table[table["count"] > 0].drop(columns="count")
+        table = table.sort_values(["theta", "z"], kind="stable")
+        if args.span_bins == 1:
+            table = table.drop(columns="z")
+        fname = os.path.join(fdir, "cylcp.dat")
+        table.to_csv(fname, index=False)
+
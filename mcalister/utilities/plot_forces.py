@@ -7,6 +7,7 @@
 # ========================================================================
 import argparse
 import os
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_pdf import PdfPages
@@ -14,6 +15,11 @@ import pandas as pd
 import utilities
 import definitions as defs
 
+# The force history reader is shared with the cylinder utilities
+scriptpath = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(scriptpath, "..", "..", "cylinder", "utilities"))
+import forces
+
 
 # ========================================================================
 #
@@ -80,7 +86,7 @@ if __name__ == "__main__":
         fdir = os.path.abspath(folder)
         yname = os.path.join(fdir, "mcalister.yaml")
         oname = os.path.join(fdir, "forces.dat")
-        df = pd.read_csv(oname, delim_whitespace=True)
+        df = forces.read_forces(oname)
         dim = defs.get_dimension(yname)
 
         u0, v0, w0, umag0, rho0, mu, flow_angle = utilities.parse_ic(yname)